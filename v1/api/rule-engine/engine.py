@@ -43,6 +43,7 @@ class RuleManager:
     def __init__(self):
         self.rules = []
         self.keyword_map = {}
+        self.lemma_keyword_map = {}
         self.rule_embeddings = {}
         self.redis_client = redis.Redis(host='localhost', port=6379, db=0)  # Redis connection
     
@@ -60,12 +61,21 @@ class RuleManager:
     def _precompute(self):
         """Precompute all embeddings and indexes"""
         self.keyword_map = {}
+        self.lemma_keyword_map = {}
         self.rule_embeddings = {}
         
         for rule in self.rules:
             # Keyword index
             for kw in rule.get('keywords', []):
                 self.keyword_map.setdefault(kw.lower(), []).append(rule['id'])
+        
+        # Lemmatize every keyword once, in one batch, instead of per input word
+        keywords = list(self.keyword_map)
+        for kw, doc in zip(keywords, nlp.pipe(keywords)):
+            lemma = " ".join(token.lemma_ for token in doc)
+            self.lemma_keyword_map.setdefault(lemma, []).extend(self.keyword_map[kw])
+        
+        for rule in self.rules:
             
             # Semantic index
             if 'examples' in rule:
@@ -175,28 +185,26 @@ async def check_input(request: InputRequest):
         return {"error": "Processing failed"}
       
 
-async def lemmatize(text):
+def lemmatize(text):
     doc = nlp(text)
     return [token.lemma_ for token in doc]
 
 async def check_keywords(text):
-    """Fast trie-based keyword matching with lemmatization"""
+    """Keyword matching on lemmas; rule keywords are lemmatized once at load time"""
     text_lower = text.lower()
     violations = []
     
     # Lemmatize the input text
     lemmatized_words = lemmatize(text_lower)
     
-    # Lemmatize the keywords in the rule
+    # Look each lemma up in the precomputed keyword lemma index
     for word in lemmatized_words:
-        for rule_id, keywords in rule_manager.keyword_map.items():
-            lemmatized_keywords = lemmatize(" ".join(keywords))
-            if word in lemmatized_keywords:
-                violations.append({
-                    "rule_id": rule_id,
-                    "type": "keyword",
-                    "matched": word
-                })
+        for rule_id in rule_manager.lemma_keyword_map.get(word, []):
+            violations.append({
+                "rule_id": rule_id,
+                "type": "keyword",
+                "matched": word
+            })
     
     return violations
 
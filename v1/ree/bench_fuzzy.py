@@ -0,0 +1,116 @@
+import random
+import string
+import time
+import numpy as np
+from Levenshtein import distance
+
+from gaurd import RuleSet, DEFAULT_EDIT_DISTANCE_THRESHOLD, MAX_EDIT_DISTANCE_RATIO
+
+# Benchmark: RuleSet.check_fuzzy_keywords, which looks keywords up in the
+# deletion index, vs. the old full scan of keyword_map, on synthetic
+# blocklists of 1k, 10k and 100k keywords. A quarter of the keywords belong to
+# an exact-match rule, which fuzzy matching must skip. Both paths must return
+# the same violations for every query word.
+
+SIZES = [1000, 10000, 100000]
+QUERIES = 300
+
+
+def scan_check(ruleset, word):
+    """The previous check_fuzzy_keywords: edit distance to every keyword"""
+    if not word or len(word) < ruleset.min_word_length_for_fuzzy:
+        return []
+    word_lower = word.lower()
+    if word_lower in ruleset.whitelist:
+        return []
+    max_distance = min(DEFAULT_EDIT_DISTANCE_THRESHOLD, int(len(word_lower) * MAX_EDIT_DISTANCE_RATIO))
+    if len(word_lower) < 4:
+        max_distance = 0
+
+    matches = []
+    for keyword, rule_infos in ruleset.keyword_map.items():
+        if abs(len(keyword) - len(word_lower)) > max_distance:
+            continue
+        edit_dist = distance(word_lower, keyword)
+        if edit_dist > max_distance:
+            continue
+        confidence = 1.0 - (edit_dist / max(len(keyword), 1))
+        min_confidence = 0.7 if len(word_lower) < 5 else 0.6
+        if confidence >= min_confidence:
+            for rule_info in rule_infos:
+                if rule_info['exact_only']:
+                    continue
+                matches.append({
+                    "rule_id": rule_info['rule_id'],
+                    "type": "fuzzy_keyword",
+                    "original": word_lower,
+                    "matched": keyword,
+                    "confidence": round(confidence, 2),
+                    "category": rule_info['category']
+                })
+    return matches
+
+
+def build_ruleset(keywords):
+    split = len(keywords) // 4
+    ruleset = RuleSet([
+        {'id': 'bench_exact', 'keywords': keywords[:split], 'keyword_match': 'exact'},
+        {'id': 'bench', 'keywords': keywords[split:]},
+    ])
+    ruleset.build()
+    return ruleset
+
+
+def random_word(rng):
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12)))
+
+
+def misspell(rng, word):
+    """Apply one or two random edits"""
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(word))
+        op = rng.choice("sid")
+        if op == "s":
+            word = word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+        elif op == "i":
+            word = word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+        elif len(word) > 4:
+            word = word[:i] + word[i + 1:]
+    return word
+
+
+def time_ms(fn, words):
+    latencies = []
+    results = []
+    for word in words:
+        start = time.perf_counter()
+        results.append(fn(word))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    rng = random.Random(0)
+    print(f"{'keywords':>9} {'build s':>8} {'scan p50':>9} {'scan p99':>9} "
+          f"{'index p50':>10} {'index p99':>10} {'same':>5}")
+
+    for size in SIZES:
+        keywords = list(dict.fromkeys(random_word(rng) for _ in range(size)))
+        start = time.perf_counter()
+        ruleset = build_ruleset(keywords)
+        build_s = time.perf_counter() - start
+
+        # Half misspelled keywords, half unrelated words
+        words = [misspell(rng, rng.choice(keywords)) for _ in range(QUERIES // 2)]
+        words += [random_word(rng) for _ in range(QUERIES - len(words))]
+
+        scan, scan_p50, scan_p99 = time_ms(lambda w: scan_check(ruleset, w), words)
+        index, index_p50, index_p99 = time_ms(ruleset.check_fuzzy_keywords, words)
+        same = scan == index
+
+        print(f"{size:>9} {build_s:>8.2f} {scan_p50:>9.3f} {scan_p99:>9.3f} "
+              f"{index_p50:>10.3f} {index_p99:>10.3f} {str(same):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import argparse
+import time
+import numpy as np
+
+from gaurd import (
+    RuleManager, make_semantic_index, model, RULES_PATH, SEMANTIC_CANDIDATES,
+    DEFAULT_SIMILARITY_THRESHOLD, MODEL_NAME, EMBEDDING_BACKEND
+)
+
+# Recall-vs-latency report for the semantic index backends.
+# The ruleset's example embeddings are padded with synthetic distractor rules
+# so the backends can be compared at the example counts policy teams want to
+# load. "noise" distractors are random unit vectors; "clusters" distractors are
+# dense groups of near-duplicates of a real example, the case where one rule's
+# examples can crowd every other rule out of the ANN candidate list.
+
+BACKENDS = ["exact", "flat", "hnsw", "ivfpq"]
+DISTRACTORS = ["noise", "clusters"]
+
+
+def build_matrix(rule_manager, total_examples, examples_per_rule, distractors, rng):
+    """Return (matrix, rule_offsets) with the real examples first and distractors after"""
+    real = rule_manager.ruleset.example_matrix
+    offsets = list(rule_manager.ruleset.rule_offsets)
+    extra = max(0, total_examples - real.shape[0])
+    if extra == 0:
+        return real, np.asarray(offsets, dtype=np.int64)
+
+    noise = rng.standard_normal((extra, real.shape[1])).astype(np.float32)
+    if distractors == "clusters":
+        # Every distractor rule is centred on one real example, its rows ~0.97 cosine from it
+        centres = np.repeat(rng.integers(0, real.shape[0], -(-extra // examples_per_rule)),
+                            examples_per_rule)[:extra]
+        noise *= 0.25 / np.linalg.norm(noise, axis=1, keepdims=True)
+        noise += real[centres]
+    noise /= np.linalg.norm(noise, axis=1, keepdims=True)
+    offsets.extend(range(real.shape[0], real.shape[0] + extra, examples_per_rule))
+    return np.vstack([real, noise]), np.asarray(offsets, dtype=np.int64)
+
+
+def make_queries(rule_manager, n_queries, rng):
+    """Perturbed real examples, so every query has a close neighbour in the index"""
+    texts = [ex for rule in rule_manager.ruleset.semantic_rules for ex in rule['examples']]
+    base = np.asarray(model.encode(texts), dtype=np.float32)
+    base /= np.linalg.norm(base, axis=1, keepdims=True)
+    picks = base[rng.integers(0, len(base), n_queries)]
+    # Noise norm is drawn per query and kept independent of the embedding width, so
+    # similarity to the source example spreads from ~0.98 down to ~0.64 and queries
+    # land on both sides of the rule thresholds
+    noise = rng.standard_normal(picks.shape).astype(np.float32)
+    noise *= (rng.uniform(0.2, 1.2, n_queries) / np.linalg.norm(noise, axis=1))[:, None]
+    queries = picks + noise
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def run_backend(index, queries, thresholds, exact_results):
+    """Time best_per_rule and compare its verdicts to the exact backend"""
+    latencies = []
+    hits = 0
+    verdict_agree = 0
+    best_agree = 0
+    best_total = 0
+    results = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        max_sims, best_rows = index.best_per_rule(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append((max_sims, best_rows))
+        hit = set(np.flatnonzero(max_sims > thresholds))
+        hits += bool(hit)
+
+        if exact_results is None:
+            continue
+        exact_sims, exact_rows = exact_results[i]
+        exact_hit = set(np.flatnonzero(exact_sims > thresholds))
+        verdict_agree += hit == exact_hit
+        for rule_pos in exact_hit:
+            best_total += 1
+            best_agree += best_rows[rule_pos] == exact_rows[rule_pos]
+
+    latencies = np.asarray(latencies)
+    return results, {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "hit_rate": hits / len(queries),
+        "verdict_agreement": verdict_agree / len(queries) if exact_results else 1.0,
+        "best_example_recall": best_agree / best_total if best_total else 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare semantic index backends to exact search")
+    parser.add_argument("--rules", default=RULES_PATH)
+    parser.add_argument("--examples", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--examples-per-rule", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Override every rule threshold (defaults to the ruleset's)")
+    parser.add_argument("--output", default="semantic_index_report.md")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    rule_manager = RuleManager()
+    rule_manager.load_rules(args.rules, force_reload=True)
+    queries = make_queries(rule_manager, args.queries, rng)
+
+    lines = [
+        "# Semantic index recall vs latency",
+        "",
+        f"Ruleset: `{args.rules}`, {args.queries} queries, "
+        f"{SEMANTIC_CANDIDATES} ANN candidates reranked exactly.",
+        f"Embeddings: `{MODEL_NAME}` ({EMBEDDING_BACKEND}), dimension {queries.shape[1]}.",
+        "",
+        "Hit rate is the share of queries with at least one rule above threshold. "
+        "Verdict agreement is the share of queries whose set of rules above threshold "
+        "matches the exact backend. Best-example recall is the share of exact rule hits "
+        "where the backend reports the same matched example.",
+        "",
+        "| Distractors | Examples | Backend | Build s | p50 ms | p99 ms | Hit rate | "
+        "Verdict agreement | Best-example recall |",
+        "|---|---|---|---|---|---|---|---|---|",
+    ]
+
+    for distractors in DISTRACTORS:
+        for total in args.examples:
+            matrix, offsets = build_matrix(rule_manager, total, args.examples_per_rule, distractors, rng)
+            default = args.threshold if args.threshold is not None else DEFAULT_SIMILARITY_THRESHOLD
+            thresholds = np.full(len(offsets), default, dtype=np.float32)
+            if args.threshold is None:
+                thresholds[:len(rule_manager.ruleset.semantic_rules)] = rule_manager.ruleset.semantic_thresholds
+
+            exact_results = None
+            for backend in BACKENDS:
+                start = time.perf_counter()
+                index = make_semantic_index(backend, matrix, offsets, float(thresholds.min()))
+                build_s = time.perf_counter() - start
+                if index.name != backend:
+                    print(f"Skipping {backend} at {total} examples (fell back to {index.name})")
+                    continue
+
+                results, stats = run_backend(index, queries, thresholds, exact_results)
+                if backend == "exact":
+                    exact_results = results
+                lines.append(
+                    f"| {distractors} | {matrix.shape[0]} | {backend} | {build_s:.2f} | "
+                    f"{stats['p50_ms']:.3f} | {stats['p99_ms']:.3f} | {stats['hit_rate']:.3f} | "
+                    f"{stats['verdict_agreement']:.3f} | {stats['best_example_recall']:.3f} |"
+                )
+                print(lines[-1])
+
+    with open(args.output, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
 import json
 import numpy as np
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
 from sentence_transformers import SentenceTransformer
 from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-import requests
+import httpx
 import logging
-import redis
+import redis.asyncio as aioredis
 import spacy
 from typing import List, Dict, Any, Optional, Set
 import nltk
@@ -17,24 +18,150 @@ from nltk.stem.porter import PorterStemmer
 from Levenshtein import distance
 import time
 import os
+import sys
 import hashlib
+import math
+import random
 import re
-from functools import lru_cache
+import shutil
+import sqlite3
+import tempfile
+import zlib
+from abc import ABC, abstractmethod
+from functools import lru_cache, partial
+try:
+    from re import _parser as sre_parse, _compiler as sre_compile  # Python 3.11+
+except ImportError:
+    import sre_parse
+    import sre_compile
+from collections import OrderedDict, defaultdict, deque
+import threading
+
+# FAISS is optional; without it only the exact semantic index is available
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# The regex module is optional; it is needed to stop rule patterns that exceed their time budget
+try:
+    import regex
+except ImportError:
+    regex = None
+
+# pyahocorasick is optional; KeywordAutomaton falls back to a pure-Python automaton
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# fcntl is POSIX-only; without it embedding store writers are not serialized across processes
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# msgpack is optional; without it cached verdicts are stored as JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# ONNX Runtime is optional; it is only needed for the onnx embedding backends
+try:
+    import onnxruntime as ort
+    from transformers import AutoTokenizer
+except ImportError:
+    ort = None
 
 # Environment configuration with defaults
 MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-mpnet-base-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()  # torch | onnx | onnx-int8
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join("onnx", MODEL_NAME.replace("/", "_")))
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 lets ONNX Runtime decide
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "16"))
+REDIS_PIPELINE_MAX = int(os.getenv("REDIS_PIPELINE_MAX", "256"))  # Commands per pipelined round trip
 RULES_PATH = os.getenv("RULES_PATH", "rules.json")
 API_TIMEOUT = float(os.getenv("API_TIMEOUT", "5.0"))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 TOXIC_CLASSIFIER_URL = os.getenv("TOXIC_CLASSIFIER_URL", 
                                "https://toxic-classifier-api-936459055446.us-central1.run.app/predict")
 CACHE_EXPIRY = int(os.getenv("CACHE_EXPIRY", "300"))  # 5 minutes
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", "10000"))  # In-process verdicts per worker
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", "60"))
+# Stale-while-revalidate: entries older than the soft TTL are served while refreshed in the
+# background; CACHE_EXPIRY is the hard TTL. Defaults to 80% of CACHE_EXPIRY.
+CACHE_SOFT_TTL = float(os.getenv("CACHE_SOFT_TTL", str(CACHE_EXPIRY * 0.8)))
+CACHE_REFRESH_BETA = float(os.getenv("CACHE_REFRESH_BETA", "1.0"))  # Early refresh eagerness; 0 disables
+CACHE_NAMESPACE = os.getenv("CACHE_NAMESPACE", "")  # Default; a ruleset can set config.cache_namespace
+CACHE_WARMUP_TEXTS = int(os.getenv("CACHE_WARMUP_TEXTS", "1000"))  # Recent texts re-checked after a reload
+CACHE_WARMUP_BATCH = int(os.getenv("CACHE_WARMUP_BATCH", "32"))
+# Shared verdict cache behind the local tier: auto (Redis, else SQLite) | redis | sqlite | none
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "auto").lower()
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", os.path.join("cache", "results.sqlite3"))
+CACHE_DB_MAX_ENTRIES = int(os.getenv("CACHE_DB_MAX_ENTRIES", "200000"))
+CACHE_DB_MMAP_MB = int(os.getenv("CACHE_DB_MMAP_MB", "256"))
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "512"))  # zlib larger cache values; 0 disables
+CACHE_DB_PRUNE_EVERY = 1000  # Writes between expiry and size sweeps
+# Cross-worker coalescing: how long a worker may hold a key's compute lock (0 disables)
+SINGLEFLIGHT_LOCK_MS = int(os.getenv("SINGLEFLIGHT_LOCK_MS", "2000"))
+SINGLEFLIGHT_POLL_MS = int(os.getenv("SINGLEFLIGHT_POLL_MS", "20"))
 MAX_WORKERS = int(os.getenv("MAX_WORKERS", "4"))
 
+# Pooled keep-alive HTTP client for the classifier
+CLASSIFIER_HTTP2 = os.getenv("CLASSIFIER_HTTP2", "false").lower() in ("1", "true", "yes")
+CLASSIFIER_MAX_CONNECTIONS = int(os.getenv("CLASSIFIER_MAX_CONNECTIONS", "100"))
+CLASSIFIER_MAX_KEEPALIVE = int(os.getenv("CLASSIFIER_MAX_KEEPALIVE", "20"))
+CLASSIFIER_KEEPALIVE_EXPIRY = float(os.getenv("CLASSIFIER_KEEPALIVE_EXPIRY", "60"))
+# Classifier circuit breaker, adaptive timeouts and hedged requests
+CLASSIFIER_BREAKER_FAILURES = int(os.getenv("CLASSIFIER_BREAKER_FAILURES", "5"))  # Consecutive, to open
+CLASSIFIER_BREAKER_RESET = float(os.getenv("CLASSIFIER_BREAKER_RESET", "30"))  # Seconds open before a probe
+CLASSIFIER_MIN_TIMEOUT = float(os.getenv("CLASSIFIER_MIN_TIMEOUT", "0.5"))
+CLASSIFIER_TIMEOUT_MULTIPLIER = float(os.getenv("CLASSIFIER_TIMEOUT_MULTIPLIER", "3"))  # x observed p99
+CLASSIFIER_HEDGE = os.getenv("CLASSIFIER_HEDGE", "false").lower() in ("1", "true", "yes")
+CLASSIFIER_HEDGE_PERCENTILE = float(os.getenv("CLASSIFIER_HEDGE_PERCENTILE", "95"))
+CLASSIFIER_MIN_SAMPLES = 20  # Latencies needed before timeouts and hedging adapt
+# Start the classifier call on /check in parallel with the rule check
+SPECULATIVE_CLASSIFIER = os.getenv("SPECULATIVE_CLASSIFIER", "false").lower() in ("1", "true", "yes")
+
+# Pool for CPU-bound rule evaluation (thread | process) and its admission limit
+RULE_EXECUTOR = os.getenv("RULE_EXECUTOR", "thread").lower()
+RULE_WORKERS = int(os.getenv("RULE_WORKERS", str(MAX_WORKERS)))
+RULE_MAX_PENDING = int(os.getenv("RULE_MAX_PENDING", str(RULE_WORKERS * 4)))
+
+# Cross-request micro-batching of model.encode on the /check path
+ENCODE_MAX_WAIT_MS = float(os.getenv("ENCODE_MAX_WAIT_MS", "5"))
+ENCODE_MAX_BATCH = int(os.getenv("ENCODE_MAX_BATCH", "32"))
+
+# Semantic index configuration (exact | flat | hnsw | ivfpq)
+SEMANTIC_INDEX_BACKEND = os.getenv("SEMANTIC_INDEX_BACKEND", "exact").lower()
+SEMANTIC_TOP_K = int(os.getenv("SEMANTIC_TOP_K", "3"))  # Examples listed per semantic violation
+SEMANTIC_CANDIDATES = int(os.getenv("SEMANTIC_CANDIDATES", "64"))  # ANN hits reranked exactly
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+IVF_NLIST = int(os.getenv("IVF_NLIST", "256"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+IVF_PQ_M = int(os.getenv("IVF_PQ_M", "16"))
+REGEX_COMBINE_LIMIT = int(os.getenv("REGEX_COMBINE_LIMIT", "500"))  # Patterns per combined regex
+REGEX_BUDGET_MS = float(os.getenv("REGEX_BUDGET_MS", "50"))  # Per regex, per request
+REGEX_RISK_POLICY = os.getenv("REGEX_RISK_POLICY", "reject").lower()  # reject | warn
+IVF_PQ_MIN_TRAIN = 256  # 8-bit PQ codebooks need at least 2^8 training vectors
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", "256"))  # Rule examples per encode call
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "50000"))  # Memoized token stems
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "20000"))  # Texts whose tokens and embedding are kept
+
+# On-disk store of example embeddings; set EMBEDDING_STORE_DIR="" to disable
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "embedding_store")
+# Unset: derived from the loaded model's files, see model_revision
+EMBEDDING_MODEL_REVISION = os.getenv("EMBEDDING_MODEL_REVISION", "")
+# Weight and config files that identify a local model directory or ONNX export
+MODEL_FILE_SUFFIXES = (".json", ".txt", ".model", ".bin", ".safetensors", ".onnx", ".onnx_data", ".data")
+
 # Set up logging
 logging.basicConfig(
     level=getattr(logging, LOG_LEVEL),
@@ -49,6 +176,11 @@ DEFAULT_EDIT_DISTANCE_THRESHOLD = 2
 MIN_WORD_LENGTH_FOR_FUZZY = 4
 MAX_EDIT_DISTANCE_RATIO = 0.3  # Max edit distance as a ratio of word length
 
+# spaCy components the lemma view depends on; the rule-based lemmatizer needs POS tags
+NLP_LEMMA_COMPONENTS = {"tok2vec", "tagger", "attribute_ruler", "lemmatizer"}
+# Tokenizer for exact-match-only rulesets, where spaCy is skipped
+TOKEN_RE = re.compile(r"\w+(?:'\w+)*")
+
 # Common words to exclude from fuzzy matching to prevent false positives
 COMMON_WORDS_WHITELIST = {
     "the", "and", "for", "are", "this", "that", "with", "have", "from", 
@@ -78,34 +210,202 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ONNX Runtime embedding backend
+class OnnxEmbedder:
+    """Sentence embeddings from an ONNX export of a sentence-transformers model.
+
+    Mirrors SentenceTransformer.encode for the calls this service makes:
+    tokenization with truncation to the model's max_seq_length, mean pooling
+    over the attention mask and, for models that end in a Normalize module,
+    L2 normalization.
+    """
+
+    def __init__(self, model_dir, quantized=False):
+        model_path = os.path.join(model_dir, "model_int8.onnx" if quantized else "model.onnx")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        # Match the sentence-transformers config saved alongside the export
+        self.max_seq_length = 512
+        config_path = os.path.join(model_dir, "sentence_bert_config.json")
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                self.max_seq_length = json.load(f).get("max_seq_length", self.max_seq_length)
+        self.normalize = True
+        modules_path = os.path.join(model_dir, "modules.json")
+        if os.path.exists(modules_path):
+            with open(modules_path) as f:
+                self.normalize = any(m.get("type", "").endswith("Normalize") for m in json.load(f))
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            features = self.tokenizer(
+                list(sentences[start:start + batch_size]),
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            inputs = {k: v.astype(np.int64) for k, v in features.items() if k in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            # Mean pooling over real (non-padding) tokens
+            mask = features["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+
+        embeddings = np.vstack(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def hub_model_id(model_name):
+    """Hugging Face repo ID the way sentence-transformers resolves a bare model name"""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def export_onnx_model(model_name, model_dir):
+    """Export a sentence-transformers model to ONNX with optimum.
+
+    The export is written to a temporary directory next to model_dir and
+    renamed into place, so model_dir only ever holds a complete export.
+    """
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from huggingface_hub import snapshot_download
+
+    model_id = hub_model_id(model_name)
+    logger.info(f"Exporting {model_id} to ONNX in {model_dir}")
+    tmp_dir = tempfile.mkdtemp(prefix=".export-", dir=os.path.dirname(os.path.abspath(model_dir)))
+    try:
+        ort_model = ORTModelForFeatureExtraction.from_pretrained(model_id, export=True)
+        ort_model.save_pretrained(tmp_dir)
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(tmp_dir)
+        # Keep the pooling/normalization config so encode matches sentence-transformers
+        config_files = ["modules.json", "sentence_bert_config.json"]
+        if os.path.isdir(model_name):
+            for name in config_files:
+                if os.path.exists(os.path.join(model_name, name)):
+                    shutil.copy(os.path.join(model_name, name), tmp_dir)
+        else:
+            snapshot_download(model_id, local_dir=tmp_dir, allow_patterns=config_files)
+
+        # Without model.onnx the directory is what an interrupted export left behind
+        if os.path.isdir(model_dir):
+            shutil.rmtree(model_dir)
+        os.replace(tmp_dir, model_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def quantize_onnx_model(model_dir):
+    """Write a dynamic int8-quantized copy of model.onnx, swapped in with os.replace"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    model_path = os.path.join(model_dir, "model.onnx")
+    logger.info(f"Quantizing {model_path} to int8")
+    tmp_path = os.path.join(model_dir, f".model_int8.{os.getpid()}.onnx")
+    try:
+        quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, os.path.join(model_dir, "model_int8.onnx"))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_embedding_model(backend):
+    """Load the embedding model for the given backend (torch, onnx or onnx-int8)"""
+    if backend == "torch":
+        return SentenceTransformer(MODEL_NAME)
+    if backend not in ("onnx", "onnx-int8"):
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    if ort is None:
+        raise RuntimeError(f"{backend} backend requires onnxruntime and transformers "
+                           "(pip install -r requirements-onnx.txt)")
+
+    # Every uvicorn worker loads the model at import; the first one to take the lock
+    # exports (and quantizes), the others wait and then load the published files
+    quantized = backend == "onnx-int8"
+    os.makedirs(os.path.dirname(os.path.abspath(ONNX_MODEL_DIR)), exist_ok=True)
+    with open(f"{os.path.abspath(ONNX_MODEL_DIR)}.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not os.path.exists(os.path.join(ONNX_MODEL_DIR, "model.onnx")):
+            export_onnx_model(MODEL_NAME, ONNX_MODEL_DIR)
+        if quantized and not os.path.exists(os.path.join(ONNX_MODEL_DIR, "model_int8.onnx")):
+            quantize_onnx_model(ONNX_MODEL_DIR)
+    return OnnxEmbedder(ONNX_MODEL_DIR, quantized=quantized)
+
+def model_revision(backend):
+    """Identify the weights behind the loaded model, so stored embeddings follow weight updates.
+
+    A local model directory, and every ONNX export, is identified by a hash of
+    its weight and config files; a Hugging Face model by the commit of its
+    cached snapshot.
+    """
+    model_dir = MODEL_NAME if backend == "torch" else ONNX_MODEL_DIR
+    if not os.path.isdir(model_dir):
+        try:
+            from huggingface_hub import snapshot_download
+            return os.path.basename(snapshot_download(hub_model_id(MODEL_NAME), local_files_only=True))
+        except Exception as e:
+            logger.warning(f"Could not resolve the revision of {MODEL_NAME}: {str(e)}. "
+                           f"Set EMBEDDING_MODEL_REVISION to key stored embeddings by it.")
+            return "unversioned"
+
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(model_dir):
+        dirs.sort()
+        for name in sorted(files):
+            # Lock and temporary files start with a dot; the int8 copy is derived from model.onnx
+            if name.startswith(".") or name == "model_int8.onnx" or not name.endswith(MODEL_FILE_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, model_dir).encode() + b"\0")
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return f"sha256-{digest.hexdigest()[:16]}"
+
 # Initialize necessary components
 try:
-    model = SentenceTransformer(MODEL_NAME)
+    model = load_embedding_model(EMBEDDING_BACKEND)
+    # Different backends produce slightly different vectors, so they never share stored embeddings
+    EMBEDDING_VERSION = f"{EMBEDDING_MODEL_REVISION or model_revision(EMBEDDING_BACKEND)}+{EMBEDDING_BACKEND}"
     executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
     nlp = spacy.load("en_core_web_sm")
     stemmer = PorterStemmer()
     
-    # Initialize Redis with error handling and fallback
-    try:
-        redis_client = redis.Redis(
-            host=REDIS_HOST, 
-            port=REDIS_PORT, 
-            db=REDIS_DB,
-            password=REDIS_PASSWORD,
-            socket_timeout=2.0,  # Short timeout to fail fast if Redis is down
-            decode_responses=False
-        )
-        redis_client.ping()  # Test connection
-        logger.info("Redis connection established")
-        use_redis = True
-    except Exception as e:
-        logger.warning(f"Redis connection failed: {str(e)}. Running without cache.")
-        use_redis = False
+    # Async Redis client over a bounded pool; the connection is tested on startup
+    redis_client = aioredis.Redis(connection_pool=aioredis.BlockingConnectionPool(
+        host=REDIS_HOST, 
+        port=REDIS_PORT, 
+        db=REDIS_DB,
+        password=REDIS_PASSWORD,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=2.0,  # Wait at most this long for a free connection
+        socket_timeout=2.0,  # Short timeout to fail fast if Redis is down
+        decode_responses=False
+    ))
+    use_redis = False  # Set by startup_event once Redis answers a ping
+    cache_backend = None  # Shared verdict cache tier, chosen by startup_event
         
     # Download necessary NLTK data
     nltk.download('wordnet', quiet=True)
     
-    logger.info(f"Initialized with model: {MODEL_NAME}")
+    logger.info(f"Initialized with model: {MODEL_NAME}@{EMBEDDING_VERSION} ({EMBEDDING_BACKEND} backend)")
 except Exception as e:
     logger.critical(f"Initialization error: {str(e)}")
     raise RuntimeError(f"Critical initialization error: {str(e)}")
@@ -133,56 +433,1793 @@ class ContentCheckResponse(BaseModel):
     rule_details: Optional[Dict[str, Dict[str, str]]] = None
     request_id: str
 
-# Rule manager with improved accuracy
-class RuleManager:
-    def __init__(self):
+# Semantic index backends over the stacked, normalized example matrix
+class SemanticIndex:
+    """Exact inner-product search; base class for the approximate backends"""
+    name = "exact"
+
+    def __init__(self, matrix, rule_offsets):
+        self.matrix = matrix
+        self.rule_offsets = rule_offsets
+        self.size = matrix.shape[0]
+        # Map every example row back to the position of its rule
+        self.rule_sizes = np.diff(np.append(rule_offsets, self.size))
+        self.row_rules = np.repeat(np.arange(len(rule_offsets)), self.rule_sizes)
+
+    def best_per_rule(self, query):
+        """Return (max similarity, best example row) arrays indexed by rule position"""
+        max_sims, best_rows = self.best_per_rule_batch(query.reshape(1, -1))
+        return max_sims[0], best_rows[0]
+
+    def best_per_rule_batch(self, queries):
+        """best_per_rule for a queries x dimensions matrix; returns queries x rules arrays"""
+        similarities = queries @ self.matrix.T
+        max_sims = np.maximum.reduceat(similarities, self.rule_offsets, axis=1)
+        # First row of each segment that reaches the segment max
+        is_max = similarities == np.repeat(max_sims, self.rule_sizes, axis=1)
+        best_rows = np.minimum.reduceat(np.where(is_max, np.arange(self.size), self.size),
+                                        self.rule_offsets, axis=1)
+        return max_sims, best_rows
+
+    def top_examples(self, query, rule_pos, top_k):
+        """Return [(row, similarity), ...] for the top_k examples of one rule, best first"""
+        start = self.rule_offsets[rule_pos]
+        similarities = self.matrix[start:start + self.rule_sizes[rule_pos]] @ query
+        order = np.argsort(-similarities)[:top_k]
+        return [(int(start + i), float(similarities[i])) for i in order]
+
+
+class FaissSemanticIndex(SemanticIndex):
+    """FAISS candidate generation (flat, HNSW or IVF-PQ) with exact reranking.
+
+    The candidate list is the global top SEMANTIC_CANDIDATES rows, so a rule
+    with many close examples can push every example of another rule out of
+    it. When even the weakest candidate clears the lowest rule threshold the
+    list is saturated and rows beyond it may still be hits, so the query falls
+    back to exact search.
+    """
+
+    def __init__(self, matrix, rule_offsets, backend, min_threshold):
+        super().__init__(matrix, rule_offsets)
+        self.name = backend
+        self.min_threshold = min_threshold
+        self.k = min(SEMANTIC_CANDIDATES, self.size)
+        dim = matrix.shape[1]
+
+        if backend == "flat":
+            self.index = faiss.IndexFlatIP(dim)
+        elif backend == "hnsw":
+            self.index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            self.index.hnsw.efSearch = max(HNSW_EF_SEARCH, SEMANTIC_CANDIDATES)
+        elif backend == "ivfpq":
+            nlist = max(1, min(IVF_NLIST, self.size // 39))
+            # Number of PQ sub-quantizers must divide the embedding dimension
+            pq_m = max(m for m in range(1, min(IVF_PQ_M, dim) + 1) if dim % m == 0)
+            self.quantizer = faiss.IndexFlatIP(dim)
+            self.index = faiss.IndexIVFPQ(self.quantizer, dim, nlist, pq_m, 8,
+                                          faiss.METRIC_INNER_PRODUCT)
+            self.index.train(matrix)
+            self.index.nprobe = min(IVF_NPROBE, nlist)
+        else:
+            raise ValueError(f"Unknown semantic index backend: {backend}")
+
+        self.index.add(matrix)
+
+    def best_per_rule(self, query):
+        max_sims, best_rows = self.best_per_rule_batch(query.reshape(1, -1))
+        return max_sims[0], best_rows[0]
+
+    def _rerank(self, query, rows):
+        """Exact best_per_rule restricted to the candidate rows; None if they are saturated"""
+        n_rules = len(self.rule_offsets)
+        max_sims = np.full(n_rules, -np.inf, dtype=np.float32)
+        best_rows = np.full(n_rules, -1, dtype=np.int64)
+        if len(rows) == 0:
+            return max_sims, best_rows
+
+        # Rerank the candidates exactly so thresholds compare true cosine similarity
+        similarities = self.matrix[rows] @ query
+        if len(rows) == self.k and similarities.min() >= self.min_threshold:
+            return None
+        order = np.argsort(-similarities)
+        rule_pos, first = np.unique(self.row_rules[rows[order]], return_index=True)
+        max_sims[rule_pos] = similarities[order[first]]
+        best_rows[rule_pos] = rows[order[first]]
+        return max_sims, best_rows
+
+    def best_per_rule_batch(self, queries):
+        # One candidate search for all queries, then the exact rerank per query
+        _, ids = self.index.search(queries, self.k)
+        results = [self._rerank(query, rows[rows >= 0]) for query, rows in zip(queries, ids)]
+
+        saturated = [i for i, result in enumerate(results) if result is None]
+        if saturated:
+            metrics.inc("semantic_index_exact_fallbacks", len(saturated))
+            exact_sims, exact_rows = super().best_per_rule_batch(queries[saturated])
+            for pos, i in enumerate(saturated):
+                results[i] = (exact_sims[pos], exact_rows[pos])
+        return np.stack([r[0] for r in results]), np.stack([r[1] for r in results])
+
+
+def make_semantic_index(backend, matrix, rule_offsets, min_threshold):
+    """Build the configured semantic index, falling back to exact search.
+
+    min_threshold is the lowest rule threshold; similarities below it can
+    never produce a violation.
+    """
+    if backend == "exact" or matrix.shape[0] == 0:
+        return SemanticIndex(matrix, rule_offsets)
+    if faiss is None:
+        logger.warning(f"faiss is not installed; using exact semantic index instead of {backend}")
+        return SemanticIndex(matrix, rule_offsets)
+    if backend == "ivfpq" and matrix.shape[0] < IVF_PQ_MIN_TRAIN:
+        logger.warning(f"Only {matrix.shape[0]} examples, too few to train IVF-PQ; using flat index")
+        backend = "flat"
+    try:
+        return FaissSemanticIndex(matrix, rule_offsets, backend, min_threshold)
+    except Exception as e:
+        logger.error(f"Error building {backend} semantic index: {str(e)}. Using exact search.")
+        return SemanticIndex(matrix, rule_offsets)
+
+# Content-addressed store of example embeddings shared across restarts
+class EmbeddingStore:
+    """Example embeddings on disk, keyed by (model, revision, sha256 of the text).
+
+    Each record holds a hex digest and its float32 vector in one structured
+    .npy file, memory-mapped on open, so keys and vectors can never come from
+    different writes. Writes go to a temporary file and are swapped in with
+    one os.replace, and writers from other processes are serialized with a
+    lock file, so neither readers nor concurrent writers see a mixed store.
+    """
+
+    def __init__(self, directory, model_name, revision):
+        self.directory = directory
+        key = f"{model_name}@{revision}"
+        slug = re.sub(r'[^\w.-]+', '_', key)[:80]
+        digest = hashlib.sha256(key.encode()).hexdigest()[:12]
+        self.path = os.path.join(directory, f"{slug}-{digest}.records.npy")
+        self.lock_path = os.path.join(directory, f"{slug}-{digest}.lock")
+        self.vectors = None
+        self.keys = np.zeros(0, dtype="S64")
+        self.rows = {}
+        self._open()
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest().encode()
+
+    def _open(self):
+        """Memory-map the store file if it exists"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            records = np.load(self.path, mmap_mode="r")
+            self.vectors = records["vector"]
+            self.keys = np.array(records["key"])
+            self.rows = {key: row for row, key in enumerate(self.keys)}
+            logger.info(f"Opened embedding store {self.path} with {len(self.keys)} vectors")
+        except Exception as e:
+            logger.warning(f"Error opening embedding store {self.path}: {str(e)}")
+            self.vectors = None
+            self.keys = np.zeros(0, dtype="S64")
+            self.rows = {}
+
+    def lookup(self, texts):
+        """Return (embeddings or None per text, indices of texts missing from the store)"""
+        found = [None] * len(texts)
+        missing = []
+        for i, text in enumerate(texts):
+            row = self.rows.get(self.text_hash(text))
+            if row is None:
+                missing.append(i)
+            else:
+                found[i] = self.vectors[row]
+        return found, missing
+
+    def save(self, texts, embeddings, live_texts):
+        """Add new embeddings, dropping stale rows once they outnumber the live ones"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have written since we opened the store
+            self._open()
+            self._write(texts, embeddings, live_texts)
+        self._open()
+
+    def _write(self, texts, embeddings, live_texts):
+        new_keys = np.array([self.text_hash(t) for t in texts], dtype="S64")
+        new_vectors = np.asarray(embeddings, dtype=np.float32)
+
+        if self.vectors is not None and len(self.keys):
+            if new_vectors.shape[1:] != self.vectors.shape[1:]:
+                logger.warning("Embedding dimension changed; discarding the existing store")
+                keep = np.zeros(len(self.keys), dtype=bool)
+            else:
+                fresh = np.array([key not in self.rows for key in new_keys], dtype=bool)
+                new_keys, new_vectors = new_keys[fresh], new_vectors[fresh]
+                live = {self.text_hash(t) for t in live_texts}
+                keep = np.array([k in live for k in self.keys], dtype=bool)
+                if keep.sum() >= len(keep) - keep.sum():
+                    keep[:] = True  # Not enough stale rows to be worth compacting
+            new_keys = np.concatenate([self.keys[keep], new_keys])
+            new_vectors = np.concatenate([self.vectors[keep], new_vectors])
+
+        records = np.empty(len(new_keys), dtype=[
+            ("key", "S64"), ("vector", np.float32, new_vectors.shape[1:])
+        ])
+        records["key"] = new_keys
+        records["vector"] = new_vectors
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, records)
+        os.replace(tmp_path, self.path)
+
+# In-process metrics exposed on /metrics
+class Metrics:
+    """Thread-safe counters, gauges and recent-value summaries"""
+
+    def __init__(self, window=1024):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+
+    def inc(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        with self.lock:
+            self.samples[name].append(value)
+
+    def snapshot(self):
+        """Return all metrics, with count/mean/p50/p99/max over each summary window"""
+        with self.lock:
+            summaries = {}
+            for name, values in self.samples.items():
+                if values:
+                    ordered = sorted(values)
+                    summaries[name] = {
+                        "count": len(ordered),
+                        "mean": sum(ordered) / len(ordered),
+                        "p50": ordered[len(ordered) // 2],
+                        "p99": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+                        "max": ordered[-1]
+                    }
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "summaries": summaries
+            }
+
+
+metrics = Metrics()
+
+
+class TokenNormalizer:
+    """Bounded, thread-safe LRU of token stems shared across requests.
+
+    Token frequencies are heavily skewed, so a modest cache absorbs most of the
+    per-request stemming. Keyword lemmas are computed in bulk at build time.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.stems = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def stem(self, token):
+        with self.lock:
+            stem = self.stems.get(token)
+            if stem is not None:
+                self.stems.move_to_end(token)
+                self.hits += 1
+                return stem
+            self.misses += 1
+
+        # Stem outside the lock; a concurrent miss on the same token just stores it twice
+        stem = stemmer.stem(token)
+        with self.lock:
+            self.stems[token] = stem
+            if len(self.stems) > self.max_size:
+                self.stems.popitem(last=False)
+        return stem
+
+    @staticmethod
+    def lemmatize_phrases(phrases):
+        """Return the spaCy lemma form of each phrase, processed as one batch"""
+        disable = [name for name in ("parser", "ner") if name in nlp.pipe_names]
+        return [
+            " ".join(t.lemma_.lower() for t in doc if not (t.is_punct or t.is_space))
+            for doc in nlp.pipe(phrases, disable=disable)
+        ]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.stems),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+token_normalizer = TokenNormalizer(TOKEN_CACHE_SIZE)
+
+
+class FeatureCache:
+    """Bounded, thread-safe LRU of per-text NLP features that don't depend on the rules.
+
+    Keyed by a digest of the model versions and the lowercased text, so
+    entries survive ruleset reloads: re-checking a text under new rules only
+    costs the automaton scan and the similarity matmul. Token views are kept
+    per NLP tier as tuples of interned strings with stop flags packed into
+    bytes, and embeddings as float16.
+    """
+
+    def __init__(self, max_size, version):
+        self.max_size = max_size
+        self.version = version
+        self.seed = hashlib.blake2b(f"{version}\0".encode(), digest_size=16)
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # digest -> [{tier: packed tokens}, float16 embedding or None]
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text_lower):
+        digest = self.seed.copy()
+        digest.update(text_lower.encode())
+        return digest.digest()
+
+    def _lookup(self, text_lower):
+        key = self._key(text_lower)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def _entry(self, text_lower):
+        key = self._key(text_lower)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [{}, None]
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return entry
+
+    def _count(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def get_tokens(self, text_lower, tier):
+        """Return (tokens, stop flags, lemmas or None) for the tier, or None on a miss"""
+        if self.max_size <= 0:
+            return None
+        with self.lock:
+            entry = self._lookup(text_lower)
+            packed = entry[0].get(tier) if entry is not None else None
+            self._count(packed is not None)
+        return packed
+
+    def put_tokens(self, text_lower, tier, tokenized):
+        if self.max_size <= 0:
+            return
+        tokens, stop_flags, lemmas = tokenized
+        packed = (
+            tuple(sys.intern(token) for token in tokens),
+            bytes(bytearray(bool(flag) for flag in stop_flags)),
+            tuple(sys.intern(lemma) for lemma in lemmas) if lemmas is not None else None
+        )
+        with self.lock:
+            self._entry(text_lower)[0][tier] = packed
+
+    def get_embedding(self, text_lower):
+        """Return the cached float32 embedding, or None on a miss"""
+        if self.max_size <= 0:
+            return None
+        with self.lock:
+            entry = self._lookup(text_lower)
+            embedding = entry[1] if entry is not None else None
+            self._count(embedding is not None)
+        return embedding.astype(np.float32) if embedding is not None else None
+
+    def put_embedding(self, text_lower, embedding):
+        if self.max_size <= 0:
+            return
+        compact = np.asarray(embedding, dtype=np.float16)
+        with self.lock:
+            self._entry(text_lower)[1] = compact
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+feature_cache = FeatureCache(
+    FEATURE_CACHE_SIZE,
+    f"{MODEL_NAME}@{EMBEDDING_VERSION}|{nlp.meta['name']}-{nlp.meta['version']}"
+)
+
+
+def _reset_locks_after_fork():
+    # Process rule pools fork while parent threads may hold these locks; a
+    # child inheriting a held lock would block on it forever
+    for owner in (metrics, token_normalizer, feature_cache):
+        owner.lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_locks_after_fork)
+
+
+# Cross-request micro-batching for query embeddings
+class EncodeBatcher:
+    """Collects concurrent encode requests and runs them as one batched forward pass.
+
+    A batch is sent once max_batch_size texts are waiting or max_wait_ms has
+    passed since the first one arrived. Encoding runs in the thread pool so the
+    event loop keeps serving requests meanwhile.
+    """
+
+    def __init__(self, max_wait_ms, max_batch_size):
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self.queue = None
+        self.worker = None
+
+    async def encode(self, text):
+        """Return the embedding of a single text"""
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        metrics.set_gauge("encode_queue_depth", self.queue.qsize())
+        return await future
+
+    async def _next_batch(self):
+        """Wait for the first request, then gather more until the batch is full or time is up"""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [item for item in await self._next_batch() if not item[1].done()]
+            metrics.set_gauge("encode_queue_depth", self.queue.qsize())
+            if not batch:
+                continue
+
+            # Identical texts in the same batch are encoded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            metrics.observe("encode_batch_size", len(texts))
+            try:
+                embeddings = await loop.run_in_executor(executor, partial(
+                    model.encode, texts, batch_size=len(texts), show_progress_bar=False
+                ))
+                by_text = dict(zip(texts, embeddings))
+                for text, future in batch:
+                    if not future.done():
+                        future.set_result(by_text[text])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def close(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+
+# Automatic pipelining of cache commands across concurrent requests
+class RedisPipeliner:
+    """Sends all cache commands queued by concurrent requests in one pipelined round trip.
+
+    Commands that arrive while a round trip is in flight go out together in
+    the next one, so batching adds no wait at low load. Writes are
+    fire-and-forget: setex returns at once and failures are only logged.
+    """
+
+    def __init__(self, client, max_batch_size):
+        self.client = client
+        self.max_batch_size = max(1, max_batch_size)
+        self.queue = None
+        self.worker = None
+
+    def _submit(self, command, args, kwargs, future=None):
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.create_task(self._run())
+        self.queue.put_nowait((command, args, kwargs, future))
+
+    async def call(self, command, *args, **kwargs):
+        """Queue a command and wait for its reply"""
+        future = asyncio.get_running_loop().create_future()
+        self._submit(command, args, kwargs, future)
+        return await future
+
+    def send(self, command, *args, **kwargs):
+        """Queue a command without waiting for its reply"""
+        self._submit(command, args, kwargs)
+
+    async def get(self, key):
+        return await self.call("get", key)
+
+    async def mget(self, keys):
+        return await self.call("mget", keys)
+
+    def setex(self, key, ttl, value):
+        self.send("setex", key, ttl, value)
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.max_batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            # Readers that gave up (cancelled requests) are dropped; writes always go out
+            batch = [item for item in batch if item[3] is None or not item[3].done()]
+            if not batch:
+                continue
+
+            metrics.observe("redis_pipeline_size", len(batch))
+            pipe = self.client.pipeline(transaction=False)
+            for command, args, kwargs, _ in batch:
+                getattr(pipe, command)(*args, **kwargs)
+            try:
+                replies = await pipe.execute(raise_on_error=False)
+            except Exception as e:
+                metrics.inc("redis_errors")
+                logger.warning(f"Redis pipeline error: {str(e)}")
+                replies = [e] * len(batch)
+
+            for (command, _, _, future), reply in zip(batch, replies):
+                if future is None:
+                    if isinstance(reply, Exception):
+                        logger.warning(f"Redis {command} error: {str(reply)}")
+                elif not future.done():
+                    if isinstance(reply, Exception):
+                        future.set_exception(reply)
+                    else:
+                        future.set_result(reply)
+
+    async def close(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+
+
+# Shared tier of the verdict cache
+class CacheBackend(ABC):
+    """Storage shared by all workers behind the in-process tier.
+
+    Values are opaque bytes with a TTL. Locks are short-lived markers used to
+    elect the one worker that computes a verdict. Each records its holder's
+    token, so a holder whose lease ran out cannot release the lock of the
+    worker that took it over. set and release_lock are fire-and-forget.
+    """
+
+    name = "none"
+
+    @abstractmethod
+    async def get_many(self, keys):
+        """Return the value or None for each key"""
+
+    @abstractmethod
+    def set(self, key, ttl, value):
+        """Store value under key for ttl seconds"""
+
+    @abstractmethod
+    async def acquire_lock(self, key, token, ttl_ms):
+        """Return whether key's lock is now held under token"""
+
+    @abstractmethod
+    def release_lock(self, key, token):
+        """Drop key's lock if it is still held under token"""
+
+    @abstractmethod
+    async def peek(self, key):
+        """Return (value or None, whether key is still locked)"""
+
+    async def close(self):
+        pass
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis through the auto-pipeliner"""
+
+    name = "redis"
+    # Compare-and-delete, so only the lock's holder removes it
+    RELEASE_LOCK_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+    )
+
+    def __init__(self, pipeliner):
+        self.pipeliner = pipeliner
+
+    async def get_many(self, keys):
+        if len(keys) == 1:
+            return [await self.pipeliner.get(keys[0])]
+        return await self.pipeliner.mget(keys)
+
+    def set(self, key, ttl, value):
+        self.pipeliner.setex(key, ttl, value)
+
+    async def acquire_lock(self, key, token, ttl_ms):
+        return bool(await self.pipeliner.call("set", f"{key}:lock", token, nx=True, px=ttl_ms))
+
+    def release_lock(self, key, token):
+        self.pipeliner.send("eval", self.RELEASE_LOCK_SCRIPT, 1, f"{key}:lock", token)
+
+    async def peek(self, key):
+        value, locked = await asyncio.gather(
+            self.pipeliner.get(key), self.pipeliner.call("exists", f"{key}:lock")
+        )
+        return value, bool(locked)
+
+    async def close(self):
+        await self.pipeliner.close()
+
+
+class SqliteCacheBackend(CacheBackend):
+    """Embedded on-disk cache for deployments without Redis.
+
+    One SQLite file in WAL mode with memory-mapped reads, so every worker on
+    the host shares it and it survives restarts. Each process writes through
+    one thread, where writes are queued and committed together in one
+    transaction, and reads through a second thread on its own connection, so
+    lookups never queue behind a commit or a lock attempt waiting out the busy
+    timeout; WAL lets them read while another connection writes. Expired rows
+    are swept and the oldest rows evicted once the table grows past
+    max_entries.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path, max_entries, mmap_mb):
+        self.path = path
+        self.max_entries = max_entries
+        self.mmap_bytes = mmap_mb * 1024 * 1024
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-db")
+        self.read_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-db-read")
+        self.conn = None
+        self.read_conn = None
+        self.pending = []  # (sql, params) writes waiting for the next commit
+        self.flushing = None
+        self.writes = 0
+        self.pool.submit(self._connect).result()
+        self.read_pool.submit(self._connect_reader).result()
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # WAL keeps the file consistent; a crash may lose recent writes
+        self.conn.execute(f"PRAGMA mmap_size={self.mmap_bytes}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _connect_reader(self):
+        # Opened after _connect, so the file is already in WAL mode with both tables
+        self.read_conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self.read_conn.execute("PRAGMA query_only=ON")
+        self.read_conn.execute(f"PRAGMA mmap_size={self.mmap_bytes}")
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    async def _read(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.read_pool, fn, *args)
+
+    def _select(self, keys):
+        placeholders = ",".join("?" * len(keys))
+        rows = self.read_conn.execute(
+            f"SELECT key, value FROM entries WHERE key IN ({placeholders}) AND expires_at > ?",
+            (*keys, time.time())
+        ).fetchall()
+        found = dict(rows)
+        return [found.get(key) for key in keys]
+
+    async def get_many(self, keys):
+        return await self._read(self._select, list(keys))
+
+    def _write(self, sql, params):
+        self.pending.append((sql, params))
+        if self.flushing is None or self.flushing.done():
+            self.flushing = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        # Everything queued while the previous commit ran goes out in this one
+        await asyncio.sleep(0)
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            await self._run(self._commit, batch)
+        except Exception as e:
+            metrics.inc("cache_db_errors")
+            logger.warning(f"Cache database write error: {str(e)}")
+        if self.pending:
+            self.flushing = asyncio.ensure_future(self._flush())
+
+    def _commit(self, batch):
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for sql, params in batch:
+                self.conn.execute(sql, params)
+        self.writes += len(batch)
+        if self.writes >= CACHE_DB_PRUNE_EVERY:
+            self.writes = 0
+            self._prune()
+
+    def _prune(self):
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            expired = self.conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+            self.conn.execute("DELETE FROM locks WHERE expires_at <= ?", (now,))
+            overflow = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                # TTLs are uniform, so the rows closest to expiry are the oldest
+                self.conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires_at LIMIT ?)",
+                    (overflow,)
+                )
+        metrics.inc("cache_db_expired", expired)
+        metrics.inc("cache_db_evictions", max(overflow, 0))
+
+    def set(self, key, ttl, value):
+        self._write(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl)
+        )
+
+    def _try_lock(self, key, token, ttl_ms):
+        now = time.time()
+        # Takes the lock if it is free or its holder's lease has run out
+        return self.conn.execute(
+            "INSERT INTO locks (key, owner, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE locks.expires_at <= ?",
+            (key, token, now + ttl_ms / 1000, now)
+        ).rowcount == 1
+
+    async def acquire_lock(self, key, token, ttl_ms):
+        return await self._run(self._try_lock, key, token, ttl_ms)
+
+    def release_lock(self, key, token):
+        self._write("DELETE FROM locks WHERE key = ? AND owner = ?", (key, token))
+
+    def _peek(self, key):
+        value = self._select([key])[0]
+        locked = self.read_conn.execute(
+            "SELECT 1 FROM locks WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone() is not None
+        return value, locked
+
+    async def peek(self, key):
+        return await self._read(self._peek, key)
+
+    async def close(self):
+        if self.flushing is not None:
+            await asyncio.gather(self.flushing, return_exceptions=True)
+        await self._run(self.conn.close)
+        await self._read(self.read_conn.close)
+        self.pool.shutdown(wait=False)
+        self.read_pool.shutdown(wait=False)
+
+
+def make_cache_backend(backend):
+    """Pick the shared cache tier; None runs with the in-process tier only"""
+    if backend in ("auto", "redis") and use_redis:
+        return RedisCacheBackend(redis_pipeliner)
+    if backend in ("auto", "sqlite"):
+        try:
+            return SqliteCacheBackend(CACHE_DB_PATH, CACHE_DB_MAX_ENTRIES, CACHE_DB_MMAP_MB)
+        except Exception as e:
+            logger.error(f"Error opening cache database {CACHE_DB_PATH}: {str(e)}")
+    elif backend not in ("redis", "none"):
+        logger.warning(f"Unknown cache backend: {backend}")
+    return None
+
+
+# Request coalescing
+class SingleFlight:
+    """Shares one in-flight computation among concurrent callers with the same key.
+
+    The computation runs as its own task, so a caller that is cancelled does
+    not cancel it for the others; it is cancelled only once every caller has
+    gone. Used from the event loop only.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = {}  # key -> [task, waiter count]
+
+    def _join(self, key):
+        call = self.calls.get(key)
+        if call is not None:
+            call[1] += 1
+            metrics.inc(f"{self.name}_coalesced")
+        return call
+
+    def _start(self, key, awaitable):
+        call = [asyncio.ensure_future(awaitable), 1]
+        self.calls[key] = call
+        call[0].add_done_callback(lambda _: self.calls.pop(key) if self.calls.get(key) is call else None)
+        return call
+
+    @staticmethod
+    async def _wait(call):
+        try:
+            return await asyncio.shield(call[0])
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not call[0].done():
+                call[0].cancel()
+
+    async def do(self, key, fn):
+        """Return fn()'s result, running it only if no call for key is already in flight"""
+        call = self._join(key) or self._start(key, fn())
+        return await self._wait(call)
+
+    async def do_many(self, keys, fn):
+        """do() for many keys; fn(new_keys) computes, in one call, the keys nobody else is computing"""
+        unique_keys = list(dict.fromkeys(keys))
+        calls = {key: self._join(key) for key in unique_keys}
+        new_keys = [key for key in unique_keys if calls[key] is None]
+        if new_keys:
+            batch = asyncio.ensure_future(fn(new_keys))
+            for i, key in enumerate(new_keys):
+                calls[key] = self._start(key, self._pick(batch, i))
+        results = await asyncio.gather(*(self._wait(calls[key]) for key in unique_keys))
+        by_key = dict(zip(unique_keys, results))
+        return [by_key[key] for key in keys]
+
+    @staticmethod
+    async def _pick(batch, i):
+        return (await asyncio.shield(batch))[i]
+
+
+# Two-tier verdict cache
+class LocalCache:
+    """Size-bounded LRU with a per-entry TTL, used from the event loop only"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            metrics.inc("cache_local_expired")
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            metrics.inc("cache_local_evictions")
+
+
+class VerdictCodec:
+    """Compact versioned binary encoding of cache entries.
+
+    A value is one header byte (format version << 1 | compressed) and a
+    msgpack array [ruleset tag, soft expiry, delta, violations, pattern
+    timeouts], zlib-compressed above min_compress bytes. Each violation is
+    [rule, type, matched, confidence, category, extra]: rule is an index into
+    the ruleset (or the ID when unknown), type an index into TYPES, category 0
+    when it is the rule's own, and semantic hits store the example index in
+    place of the example text, with their top examples as [index, similarity]
+    pairs in extra. Values from another ruleset or format decode to None.
+    JSON values, from older releases or written without msgpack, still decode.
+    """
+
+    FORMAT = 2
+    TYPES = ("pattern", "keyword", "lemma_keyword", "stemmed_keyword", "fuzzy_keyword", "semantic")
+    TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+    CORE_FIELDS = ("rule_id", "type", "matched", "confidence", "category")
+
+    def __init__(self, min_compress):
+        self.min_compress = min_compress
+        self.tag = b""
         self.rules = []
-        self.keyword_map = {}
-        self.stemmed_keyword_map = {}
-        self.rule_embeddings = {}
-        self.rule_patterns = {}
-        self.last_reload_time = 0
-        self.min_word_length_for_fuzzy = MIN_WORD_LENGTH_FOR_FUZZY
-        self.whitelist = COMMON_WORDS_WHITELIST
+        self.rule_index = {}
+        self.example_index = {}  # rule_id -> {example text: index}
+
+    def load(self, version, rules):
+        """Intern the IDs, categories and examples of the ruleset entries are encoded against"""
+        self.tag = hashlib.blake2b(version.encode(), digest_size=4).digest()
+        self.rules = [rule for rule in rules if rule.get('id')]
+        self.rule_index = {rule['id']: i for i, rule in enumerate(self.rules)}
+        self.example_index = {
+            rule['id']: {example: i for i, example in enumerate(rule.get('examples', []))}
+            for rule in self.rules
+        }
+
+    def encode(self, entry):
+        if msgpack is None:
+            return json.dumps(entry).encode()
+        result = entry["result"]
+        payload = msgpack.packb([
+            self.tag, entry["soft_expiry"], entry["delta"],
+            [self._pack_violation(violation) for violation in result["violations"]],
+            result.get("pattern_timeout")
+        ])
+        if self.min_compress and len(payload) >= self.min_compress:
+            compressed = zlib.compress(payload, 1)
+            if len(compressed) < len(payload):
+                return bytes([self.FORMAT << 1 | 1]) + compressed
+        return bytes([self.FORMAT << 1]) + payload
+
+    def decode(self, value):
+        """Return the cache entry, or None if it can't be used with the current ruleset"""
+        if isinstance(value, str):
+            value = value.encode()  # JSON stored as text by the SQLite backend
+        header = value[0]
+        if header == ord("{"):
+            entry = json.loads(value)
+            if "result" not in entry:
+                # Bare verdict from before soft TTLs; serve it and refresh
+                entry = {"result": entry, "soft_expiry": 0, "delta": 0.0}
+            return entry
+        if header >> 1 != self.FORMAT or msgpack is None:
+            return None
+        payload = zlib.decompress(value[1:]) if header & 1 else value[1:]
+        tag, soft_expiry, delta, violations, pattern_timeout = msgpack.unpackb(payload)
+        if tag != self.tag:
+            return None
+        result = {"violations": [self._unpack_violation(packed) for packed in violations]}
+        if pattern_timeout:
+            result["pattern_timeout"] = pattern_timeout
+        return {"result": result, "soft_expiry": soft_expiry, "delta": delta}
+
+    def _pack_violation(self, violation):
+        rule_id = violation["rule_id"]
+        rule_pos = self.rule_index.get(rule_id)
+        rule = self.rules[rule_pos] if rule_pos is not None else None
+        matched = violation.get("matched")
+        extra = {key: value for key, value in violation.items() if key not in self.CORE_FIELDS}
+
+        category = violation.get("category")
+        if "category" in violation and rule is not None and category == rule.get("category", "general"):
+            category = 0
+
+        if violation["type"] == "semantic" and rule is not None:
+            details = extra.get("details", {})
+            examples = self.example_index[rule_id]
+            example_pos = examples.get(details.get("matched_example"))
+            top = [[examples.get(hit.get("example")), hit.get("similarity")]
+                   for hit in details.get("top_examples", [])]
+            if (example_pos is not None and matched == "semantic similarity"
+                    and details.get("similarity") == violation["confidence"]
+                    and set(details) <= {"similarity", "matched_example", "top_examples"}
+                    and all(pos is not None and set(hit) == {"example", "similarity"}
+                            for (pos, _), hit in zip(top, details.get("top_examples", [])))):
+                matched = example_pos
+                del extra["details"]
+                if top:
+                    extra["top_examples"] = top
+
+        return [
+            rule_pos if rule_pos is not None else rule_id,
+            self.TYPE_CODES.get(violation["type"], violation["type"]),
+            matched,
+            violation["confidence"],
+            category,
+            extra or None
+        ]
+
+    def _unpack_violation(self, packed):
+        rule_ref, type_ref, matched, confidence, category, extra = packed
+        rule = self.rules[rule_ref] if isinstance(rule_ref, int) else None
+        violation = {
+            "rule_id": rule["id"] if rule is not None else rule_ref,
+            "type": self.TYPES[type_ref] if isinstance(type_ref, int) else type_ref,
+            "matched": matched,
+            "confidence": confidence
+        }
+        if violation["type"] == "semantic" and isinstance(matched, int):
+            violation["matched"] = "semantic similarity"
+            violation["details"] = {"similarity": confidence, "matched_example": rule["examples"][matched]}
+            top = (extra or {}).pop("top_examples", None)
+            if top:
+                violation["details"]["top_examples"] = [
+                    {"example": rule["examples"][pos], "similarity": similarity} for pos, similarity in top
+                ]
+        if category == 0:
+            violation["category"] = rule.get("category", "general")
+        elif category is not None:
+            violation["category"] = category
+        if extra:
+            violation.update(extra)
+        return violation
+
+
+class ResultCache:
+    """Rule verdicts in an in-process LRU/TTL tier in front of Redis.
+
+    Local hits skip the network entirely; hits in the shared tier (Redis or
+    the SQLite file, see make_cache_backend) are copied into the local tier.
+    Without a shared tier the local tier keeps serving on its own.
+
+    Entries are {"result", "soft_expiry", "delta"}: ttl is the hard TTL, after
+    which an entry is gone, and soft_ttl marks it for a background refresh.
+    delta is how long the verdict took to compute, which scales the
+    probabilistic early refresh (XFetch) so hot keys don't expire together.
+    """
+
+    def __init__(self, local_size, local_ttl, ttl, soft_ttl, codec):
+        self.local = LocalCache(local_size, min(local_ttl, ttl))
+        self.codec = codec
+        self.ttl = ttl
+        self.soft_ttl = min(soft_ttl, ttl) if soft_ttl > 0 else ttl
+        self.version = None  # Key prefix of the ruleset the cache currently serves
+        self.recent = OrderedDict()  # Recently checked texts, replayed to warm a new version
+
+    def remember(self, text):
+        if CACHE_WARMUP_TEXTS <= 0:
+            return
+        self.recent[text] = None
+        self.recent.move_to_end(text)
+        if len(self.recent) > CACHE_WARMUP_TEXTS:
+            self.recent.popitem(last=False)
+
+    def switch_version(self, version, rules):
+        """Start serving a new ruleset version; returns the recent texts, most recent first"""
+        self.version = version
+        self.codec.load(version, rules)
+        # Old-version entries can never be hit again
+        self.local.entries.clear()
+        return list(reversed(self.recent))
+
+    async def get(self, key):
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys):
+        """Return cache entries (or None) for keys, reading the shared tier once for the local misses"""
+        results = [self.local.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        metrics.inc("cache_local_hits", len(keys) - len(missing))
+        metrics.inc("cache_local_misses", len(missing))
+        if not missing or cache_backend is None:
+            return results
+
+        name = cache_backend.name
+        try:
+            cached = await cache_backend.get_many([keys[i] for i in missing])
+        except Exception as e:
+            metrics.inc(f"cache_{name}_errors")
+            logger.warning(f"{name} cache get error: {str(e)}")
+            return results
+
+        for i, value in zip(missing, cached):
+            if value:
+                results[i] = self._decode(value)
+                if results[i] is not None:
+                    self.local.set(keys[i], results[i])
+        shared_hits = sum(1 for i in missing if results[i] is not None)
+        metrics.inc(f"cache_{name}_hits", shared_hits)
+        metrics.inc(f"cache_{name}_misses", len(cached) - shared_hits)
+        return results
+
+    def set(self, key, result, delta=0.0):
+        """Store a verdict in both tiers; the shared write is fire-and-forget"""
+        entry = {"result": result, "soft_expiry": time.time() + self.soft_ttl, "delta": delta}
+        self.local.set(key, entry)
+        if cache_backend is not None:
+            cache_backend.set(key, self.ttl, self._encode(entry))
+
+    @staticmethod
+    def needs_refresh(entry):
+        """True past the soft expiry, and with rising probability shortly before it"""
+        early = -entry["delta"] * CACHE_REFRESH_BETA * math.log(1.0 - random.random())
+        return time.time() + early >= entry["soft_expiry"]
+
+    def _encode(self, entry):
+        encoded = self.codec.encode(entry)
+        metrics.observe("cache_value_bytes", len(encoded))
+        return encoded
+
+    def _decode(self, value):
+        try:
+            return self.codec.decode(value)
+        except Exception as e:
+            metrics.inc("cache_decode_errors")
+            logger.warning(f"Cache value decode error: {str(e)}")
+            return None
+
+    async def acquire_lock(self, key):
+        """Try to become the worker that computes key.
+
+        Returns the token to release the lock with, or None if another worker
+        holds it. Always succeeds without a shared tier.
+        """
+        token = os.urandom(8).hex()
+        if cache_backend is None or SINGLEFLIGHT_LOCK_MS <= 0:
+            return token
+        try:
+            return token if await cache_backend.acquire_lock(key, token, SINGLEFLIGHT_LOCK_MS) else None
+        except Exception as e:
+            logger.warning(f"{cache_backend.name} cache lock error: {str(e)}")
+            return token
+
+    def release_lock(self, key, token):
+        if cache_backend is not None and SINGLEFLIGHT_LOCK_MS > 0:
+            cache_backend.release_lock(key, token)
+
+    async def wait_for(self, key):
+        """Poll the shared tier for the lock holder's verdict; None if the lock goes away or times out without one"""
+        deadline = time.monotonic() + SINGLEFLIGHT_LOCK_MS / 1000
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(SINGLEFLIGHT_POLL_MS / 1000)
+                value, locked = await cache_backend.peek(key)
+                entry = self._decode(value) if value else None
+                if entry is not None:
+                    self.local.set(key, entry)
+                    return entry["result"]
+                if not locked:
+                    return None
+        except Exception as e:
+            logger.warning(f"{cache_backend.name} cache wait error: {str(e)}")
+        return None
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "backend": cache_backend.name if cache_backend is not None else "none",
+            "local_size": len(self.local.entries),
+            "local_max_size": self.local.max_size
+        }
+
+
+# Bounded worker pool for pattern, keyword and fuzzy matching
+class RuleEvaluatorSaturated(Exception):
+    """Raised when the rule evaluation pool has no room for more work"""
+
+
+class RuleEvaluator:
+    """Runs rule stages off the event loop, in a thread or a forked process pool.
+
+    Process workers are forked after the ruleset is built, so they inherit the
+    spaCy pipeline, automaton and pattern matcher copy-on-write, and the pool
+    is re-forked whenever the ruleset generation changes. Query encoding stays
+    in the parent (see EncodeBatcher), so workers never touch the model.
+    Submissions beyond max_pending are rejected instead of queued.
+    """
+
+    def __init__(self, kind, max_workers, max_pending):
+        if kind == "process" and "fork" not in multiprocessing.get_all_start_methods():
+            logger.warning("fork is not available; using a thread pool for rule evaluation")
+            kind = "thread"
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.pool = None
+        self.generation = None
+
+    def _ensure_pool(self):
+        generation = rule_manager.generation
+        if self.pool is not None and (self.kind == "thread" or self.generation == generation):
+            return
+        if self.pool is not None:
+            # In-flight work finishes on the old workers with the old rules
+            self.pool.shutdown(wait=False)
+            logger.info("Ruleset changed; re-forking rule evaluation workers")
+        if self.kind == "process":
+            self.pool = ProcessPoolExecutor(self.max_workers,
+                                            mp_context=multiprocessing.get_context("fork"))
+            # Fork every worker now, while the parent holds the freshly built rules
+            for _ in range(self.max_workers):
+                self.pool.submit(os.getpid)
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.generation = generation
+
+    def start(self):
+        self._ensure_pool()
+        logger.info(f"Rule evaluation pool: {self.max_workers} {self.kind} workers, "
+                    f"max {self.max_pending} pending")
+
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool; fn must be a module-level function for process pools"""
+        if self.pending >= self.max_pending:
+            metrics.inc("rule_pool_rejected")
+            raise RuleEvaluatorSaturated(f"{self.pending} rule evaluations already pending")
+
+        self._ensure_pool()
+        self.pending += 1
+        metrics.set_gauge("rule_pool_pending", self.pending)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.pending -= 1
+            metrics.set_gauge("rule_pool_pending", self.pending)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+
+# Resilience for the classifier dependency
+class CircuitBreaker:
+    """Closed / open / half-open breaker over consecutive failures.
+
+    After failure_threshold consecutive failures the breaker opens and calls
+    fast-fail. Once reset_timeout has passed, a single probe is let through
+    (half-open): success closes the breaker, failure re-opens it. Used from
+    the event loop only, so no locking.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self):
+        """Return whether a call may go out now"""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state("half_open")
+        if self.state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.probing = False
+        if self.state != "closed":
+            self._set_state("closed")
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            if self.state != "open":
+                self._set_state("open")
+
+    def release_probe(self):
+        """Forget an in-flight probe that was cancelled before it could succeed or fail"""
+        self.probing = False
+
+    def _set_state(self, state):
+        logger.warning(f"{self.name} circuit breaker {self.state} -> {state}")
+        self.state = state
+        metrics.inc(f"{self.name}_breaker_{state}")
+
+
+class LatencyTracker:
+    """Recent successful call latencies, for adaptive timeouts and hedge delays"""
+
+    def __init__(self, window=500):
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, pct):
+        """Return the pct-th percentile in seconds, or None before CLASSIFIER_MIN_SAMPLES calls"""
+        if len(self.samples) < CLASSIFIER_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def timeout(self):
+        """A multiple of observed p99, clamped to [CLASSIFIER_MIN_TIMEOUT, API_TIMEOUT]"""
+        p99 = self.percentile(99)
+        if p99 is None:
+            return API_TIMEOUT
+        return min(API_TIMEOUT, max(CLASSIFIER_MIN_TIMEOUT, p99 * CLASSIFIER_TIMEOUT_MULTIPLIER))
+
+# Multi-pattern keyword matching
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds every keyword and phrase in one linear pass.
+
+    Each pattern carries a list of payloads. Matches are only reported when
+    they start and end on word boundaries. Uses pyahocorasick when installed
+    and a pure-Python automaton otherwise.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.native = None
+        # Pure-Python automaton: transitions, failure links, the pattern ending at
+        # each state, and the nearest pattern-ending state along the failure chain
+        self.goto = [{}]
+        self.fail = [0]
+        self.terminal = [None]
+        self.dict_link = [0]
+
+    @staticmethod
+    def normalize(phrase):
+        """Lowercase and collapse whitespace, hyphens and underscores to single spaces"""
+        return " ".join(re.split(r"[\s\-_]+", phrase.lower())).strip()
+
+    def add(self, pattern, payload):
+        self.entries.setdefault(pattern, []).append(payload)
+
+    def build(self):
+        if ahocorasick is not None:
+            self.native = ahocorasick.Automaton()
+            for pattern in self.entries:
+                self.native.add_word(pattern, pattern)
+            if self.entries:
+                self.native.make_automaton()
+            return
+
+        for pattern in self.entries:
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.terminal.append(None)
+                    self.dict_link.append(0)
+                    self.goto[state][ch] = nxt
+                state = nxt
+            self.terminal[state] = pattern
+
+        # Breadth-first so every failure target is final before it is used
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                target = self.fail[nxt]
+                self.dict_link[nxt] = target if self.terminal[target] is not None else self.dict_link[target]
+
+    @staticmethod
+    def _on_boundary(text, start, end):
+        before = text[start - 1] if start > 0 else " "
+        after = text[end] if end < len(text) else " "
+        return not (before.isalnum() or before == "_") and not (after.isalnum() or after == "_")
+
+    def iter_matches(self, text):
+        """Yield (start, end, pattern) for each whole-word pattern occurrence"""
+        if not self.entries:
+            return
+        if self.native is not None:
+            for last, pattern in self.native.iter(text):
+                start = last - len(pattern) + 1
+                if self._on_boundary(text, start, last + 1):
+                    yield start, last + 1, pattern
+            return
+
+        goto, fail, terminal, dict_link = self.goto, self.fail, self.terminal, self.dict_link
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            out = state if terminal[state] is not None else dict_link[state]
+            while out:
+                pattern = terminal[out]
+                start = i - len(pattern) + 1
+                if self._on_boundary(text, start, i + 1):
+                    yield start, i + 1, pattern
+                out = dict_link[out]
+
+# Fuzzy keyword lookup
+class FuzzyKeywordIndex:
+    """SymSpell-style deletion index for finding keywords within a small edit distance.
+
+    Every keyword is stored under all strings reachable from it by up to
+    max_distance deletions. Two strings within edit distance n always share
+    such a variant when up to n deletions are taken from each, so a lookup
+    only has to verify keywords that share a variant with the query word.
+    """
+
+    def __init__(self, keywords, max_distance):
+        self.max_distance = max_distance
+        self.order = {}
+        self.deletes = defaultdict(list)
+        for kw in keywords:
+            self.order[kw] = len(self.order)
+            for variant in self._deletions(kw, max_distance):
+                self.deletes[variant].append(kw)
+
+    @staticmethod
+    def _deletions(word, max_distance):
+        variants = {word}
+        frontier = {word}
+        for _ in range(max_distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+            variants |= frontier
+        return variants
+
+    def lookup(self, word, max_distance):
+        """Return [(keyword, edit distance)] within max_distance, in keyword insertion order"""
+        max_distance = min(max_distance, self.max_distance)
+        candidates = set()
+        for variant in self._deletions(word, max_distance):
+            candidates.update(self.deletes.get(variant, ()))
+
+        results = []
+        for keyword in sorted(candidates, key=self.order.__getitem__):
+            if abs(len(keyword) - len(word)) > max_distance:
+                continue
+            edit_dist = distance(word, keyword)
+            if edit_dist <= max_distance:
+                results.append((keyword, edit_dist))
+        return results
+
+# Rule regex patterns
+def regex_nodes(parsed):
+    """Yield every (op, argument) node of a parsed regex, depth first"""
+    for op, av in parsed:
+        yield op, av
+        stack = [av]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, sre_parse.SubPattern):
+                yield from regex_nodes(item)
+            elif isinstance(item, (list, tuple)):
+                stack.extend(item)
+
+
+# Characters used to compare the character classes of regex nodes: ASCII, Latin-1 and Latin Extended
+REGEX_PROBE_CHARS = [chr(c) for c in range(0x250)]
+REGEX_CHAR_OPS = (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.IN, sre_parse.ANY, sre_parse.CATEGORY)
+
+
+def regex_chars(nodes):
+    """Return the probe characters that any single-character node among nodes can match"""
+    chars = set()
+    for op, av in regex_nodes(nodes):
+        if op in REGEX_CHAR_OPS:
+            node = sre_compile.compile(sre_parse.SubPattern(sre_parse.State(), [(op, av)]), re.IGNORECASE)
+            chars.update(ch for ch in REGEX_PROBE_CHARS if node.fullmatch(ch))
+    return chars
+
+
+def regex_sequence(nodes):
+    """Flatten groups into the sequence of nodes they match one after another"""
+    sequence = []
+    for op, av in nodes:
+        if op is sre_parse.SUBPATTERN:
+            sequence.extend(regex_sequence(av[-1]))
+        else:
+            sequence.append((op, av))
+    return sequence
+
+
+def regex_min_width(node):
+    return sre_parse.SubPattern(sre_parse.State(), [node]).getwidth()[0]
+
+
+def regex_first_chars(nodes):
+    """Characters a match of the node sequence can start with (over-approximated)"""
+    chars = set()
+    for node in regex_sequence(nodes):
+        chars |= regex_chars([node])
+        if regex_min_width(node) > 0:
+            break
+    return chars
+
+
+def regex_delimited(body, position):
+    """True if a mandatory node the repeat at position can't match separates it from its next iteration"""
+    item_chars = regex_chars(body[position][1][2])
+    for node in body[position + 1:] + body[:position]:
+        if regex_min_width(node) > 0 and not regex_chars([node]) & item_chars:
+            return True
+    return False
+
+
+def regex_risk(pattern):
+    """Return (reason, severe) if a pattern is prone to catastrophic backtracking, else None.
+
+    A repeat inside a repeat, where either level is unbounded, is severe when
+    the outer repeat's body can match the same text in more than one way: the
+    inner repeat is not separated from the next iteration by a mandatory
+    character it can't match, as in (a+)+ or (\w+\s?)*. Delimited repeats
+    such as (?:\d{3}[-.])+ are linear and pass. Alternatives under an
+    unbounded repeat are severe when they can start with the same character,
+    as in (ab|a.)+. The parser factors common prefixes out of alternations,
+    turning (a|aa)+ into (?:a(?:|a))+, so an alternation that can match
+    nothing is also severe when another of its alternatives can match nothing
+    or start with a character that may follow it; (a|ab)+, which becomes
+    (?:a(?:|b))+, passes.
+    """
+    repeat_ops = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+    for op, av in regex_nodes(sre_parse.parse(pattern)):
+        if op not in repeat_ops or av[1] <= 1:
+            continue
+        body = regex_sequence(av[2])
+        positions = {id(node_av): i for i, (node_op, node_av) in enumerate(body)
+                     if node_op in repeat_ops or node_op is sre_parse.BRANCH}
+        for inner_op, inner_av in regex_nodes(av[2]):
+            if inner_op in repeat_ops and inner_av[1] > 1 and sre_parse.MAXREPEAT in (av[1], inner_av[1]):
+                # Repeats nested deeper than the body's own sequence are not analyzed further
+                position = positions.get(id(inner_av))
+                if position is None or not regex_delimited(body, position):
+                    return "ambiguous nested quantifiers", True
+            if inner_op is sre_parse.BRANCH and av[1] == sre_parse.MAXREPEAT:
+                first_chars = [regex_first_chars(branch) for branch in inner_av[1]]
+                for i, chars in enumerate(first_chars):
+                    if any(chars & other for other in first_chars[i + 1:]):
+                        return "overlapping alternatives under an unbounded quantifier", True
+                # The engine stops an iteration that matched nothing, so an alternation that
+                # can match nothing only makes the repeat ambiguous if the rest of the iteration
+                # consumes input. A branch nested deeper than the body's own sequence is assumed to.
+                position = positions.get(id(inner_av))
+                if regex_min_width((inner_op, inner_av)) == 0 and (
+                        position is None
+                        or any(regex_min_width(node) > 0 for node in body[:position] + body[position + 1:])):
+                    empty = [alternative for alternative in inner_av[1]
+                             if sre_parse.SubPattern(sre_parse.State(), list(alternative)).getwidth()[0] == 0]
+                    # Characters that may follow the branch: the rest of the iteration, then the next one
+                    if position is None:
+                        follow = regex_chars(body)
+                    else:
+                        follow = regex_first_chars(body[position + 1:] + body)
+                    if len(empty) > 1 or any(chars & follow for chars in first_chars):
+                        return "overlapping alternatives under an unbounded quantifier", True
+    return None
+
+
+class PatternMatcher:
+    """Rule patterns compiled into as few combined regexes as possible.
+
+    Mergeable patterns become alternatives of one regex that gates them: a
+    text that doesn't match it is done after one scan. The alternation reports
+    one match per span and hides overlapping matches, but any pattern's match
+    starts inside a reported span, since every other position was tried by
+    the combined scan. Only patterns that match at a position inside a span
+    are re-run on their own, so every match is attributed to its rule.
+    (Wrapping alternatives in capture groups would name the winner directly,
+    but stops the engine from factoring their common prefixes and makes the
+    combined scan several times slower.) Patterns that would change meaning
+    inside an alternation (backreferences, named groups, inline global flags,
+    or possibly-empty matches) are run on their own and reported at build
+    time.
+
+    Patterns prone to catastrophic backtracking are rejected (or only logged,
+    per REGEX_RISK_POLICY). With the regex module installed, every regex also
+    gets a REGEX_BUDGET_MS time budget per request; a regex that runs out is
+    stopped and its rules are reported as timed out.
+    """
+
+    def __init__(self):
+        self.engine = regex or re
+        self.pending = []
+        self.combined = []
+        self.separate = []
+        self.unmergeable = []
+        self.rejected = []
+        self.risky = set()  # Compiled patterns kept despite a backtracking risk
+
+    @staticmethod
+    def merge_blocker(pattern, compiled):
+        """Return why a pattern cannot join a combined regex, or None"""
+        if compiled.groupindex:
+            return "named groups"
+        parsed = sre_parse.parse(pattern)
+        if parsed.state.flags & ~re.UNICODE:
+            return "inline global flags"
+        if parsed.getwidth()[0] == 0:
+            return "can match the empty string"
+        if any(op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS) for op, _ in regex_nodes(parsed)):
+            return "backreferences"
+        return None
+
+    def add(self, rule_id, pattern):
+        """Compile a pattern for a rule; returns None if it is rejected, raises if it is invalid"""
+        compiled = self.engine.compile(pattern, self.engine.IGNORECASE)
+        try:
+            risk = regex_risk(pattern)
+        except Exception as e:
+            risk = (f"could not be analyzed: {str(e)}", False)
+        if risk:
+            reason, severe = risk
+            if severe and REGEX_RISK_POLICY == "reject":
+                logger.error(f"Rejected pattern for rule {rule_id} ({reason}): {pattern}")
+                self.rejected.append({"rule_id": rule_id, "pattern": pattern, "reason": reason})
+                return None
+            logger.warning(f"Pattern for rule {rule_id} may backtrack heavily ({reason}): {pattern}")
+            self.risky.add(compiled)
+
+        reason = self.merge_blocker(pattern, compiled)
+        if reason:
+            self.separate.append((rule_id, compiled))
+            self.unmergeable.append({"rule_id": rule_id, "pattern": pattern, "reason": reason})
+        else:
+            self.pending.append((rule_id, pattern, compiled))
+        return compiled
+
+    def build(self):
+        for chunk_start in range(0, len(self.pending), REGEX_COMBINE_LIMIT):
+            chunk = self.pending[chunk_start:chunk_start + REGEX_COMBINE_LIMIT]
+            try:
+                combined = self.engine.compile(
+                    "|".join(f"(?:{pattern})" for _, pattern, _ in chunk),
+                    self.engine.IGNORECASE
+                )
+                members = [(rule_id, compiled) for rule_id, _, compiled in chunk]
+                self.combined.append((combined, members))
+            except Exception as e:
+                logger.warning(f"Could not combine {len(chunk)} patterns ({str(e)}); running them separately")
+                for rule_id, pattern, compiled in chunk:
+                    self.separate.append((rule_id, compiled))
+                    self.unmergeable.append({"rule_id": rule_id, "pattern": pattern, "reason": str(e)})
+        self.pending = []
 
-    def load_rules(self, filepath, force_reload=False):
-        """Load rules with modification time checking and precompute embeddings"""
+        for item in self.unmergeable:
+            logger.warning(f"Pattern for rule {item['rule_id']} runs separately ({item['reason']}): "
+                           f"{item['pattern']}")
+
+    def _budgeted(self, compiled, text, rule_ids, timeouts):
+        """Yield the matches of one regex until it runs out of its time budget"""
+        start = time.perf_counter()
         try:
-            # Check if file has been modified
-            if os.path.exists(filepath):
-                current_mtime = os.path.getmtime(filepath)
-                if not force_reload and current_mtime <= self.last_reload_time:
-                    return  # File hasn't changed, no need to reload
-                
-                with open(filepath) as f:
-                    data = json.load(f)
-                    self.rules = data.get('rules', [])
-                    
-                    # Load optional configuration
-                    config = data.get('config', {})
-                    self.min_word_length_for_fuzzy = config.get('min_word_length_for_fuzzy', MIN_WORD_LENGTH_FOR_FUZZY)
-                    whitelist_additions = set(config.get('whitelist', []))
-                    self.whitelist = COMMON_WORDS_WHITELIST.union(whitelist_additions)
-                    
-                    self._precompute()
-                    self.last_reload_time = current_mtime
-                    
-                logger.info(f"Loaded {len(self.rules)} rules from {filepath}")
+            if regex is not None:
+                yield from compiled.finditer(text, timeout=REGEX_BUDGET_MS / 1000)
             else:
-                logger.error(f"Rules file not found: {filepath}")
-                # Load empty rules to continue operating
-                self.rules = []
-                self._precompute()
-        except Exception as e:
-            logger.error(f"Error loading rules: {str(e)}")
-            # Don't raise - continue with existing rules if any
+                yield from compiled.finditer(text)
+        except TimeoutError:
+            metrics.inc("pattern_timeouts")
+            timeouts.update(rule_ids)
+            logger.warning(f"Pattern for rules {sorted(rule_ids)} exceeded {REGEX_BUDGET_MS}ms "
+                           f"on {len(text)} chars; stopped")
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms > REGEX_BUDGET_MS:
+            # Without the regex module a slow pattern cannot be stopped, only recorded
+            metrics.inc("pattern_budget_exceeded")
+            logger.warning(f"Pattern for rules {sorted(rule_ids)} took {elapsed_ms:.0f}ms")
 
-    def _precompute(self):
-        """Precompute indices for efficient matching"""
+    def _starts_within(self, compiled, text, spans, rule_ids, timeouts):
+        """True if the regex matches starting at any position inside the spans"""
+        # A timeout costs more than a single match attempt, so only risky patterns get one;
+        # the budget is still checked between attempts
+        guarded = regex is not None and compiled in self.risky
+        deadline = time.perf_counter() + REGEX_BUDGET_MS / 1000
+        try:
+            for start, end in spans:
+                for pos in range(start, end):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise TimeoutError
+                    if guarded:
+                        match = compiled.match(text, pos, timeout=remaining)
+                    else:
+                        match = compiled.match(text, pos)
+                    if match:
+                        return True
+        except TimeoutError:
+            metrics.inc("pattern_timeouts")
+            timeouts.update(rule_ids)
+            logger.warning(f"Pattern for rules {sorted(rule_ids)} exceeded {REGEX_BUDGET_MS}ms "
+                           f"on {len(text)} chars; stopped")
+        return False
+
+    def finditer(self, text, timeouts):
+        """Yield (rule_id, matched text) for every non-empty match.
+
+        Rules whose regex ran out of time budget are added to timeouts.
+        """
+        for combined, members in self.combined:
+            gate_timeout = set()
+            spans = [match.span() for match in
+                     self._budgeted(combined, text, {rule_id for rule_id, _ in members}, gate_timeout)]
+            if not (spans or gate_timeout):
+                continue
+            for rule_id, compiled in members:
+                # Without a complete combined scan, every pattern runs on its own
+                if not gate_timeout and not self._starts_within(compiled, text, spans, {rule_id}, timeouts):
+                    continue
+                for match in self._budgeted(compiled, text, {rule_id}, timeouts):
+                    if match.group(0):
+                        yield rule_id, match.group(0)
+
+        for rule_id, compiled in self.separate:
+            for match in self._budgeted(compiled, text, {rule_id}, timeouts):
+                if match.group(0):
+                    yield rule_id, match.group(0)
+
+# Rule manager with improved accuracy
+class RuleSet:
+    """Everything built from one version of the rules.
+
+    Keyword maps, automaton, fuzzy index, pattern matcher, NLP plan and
+    semantic index are all built before RuleManager publishes the RuleSet
+    with a single reference swap, and none of them change afterwards. A check
+    running in the rule pool during a reload therefore sees either the old
+    rules or the new ones, never a mix.
+    """
+
+    def __init__(self, rules=(), config=None):
+        config = config or {}
+        self.rules = list(rules)
+        self.min_word_length_for_fuzzy = config.get('min_word_length_for_fuzzy', MIN_WORD_LENGTH_FOR_FUZZY)
+        self.whitelist = COMMON_WORDS_WHITELIST.union(config.get('whitelist', []))
         self.keyword_map = {}
         self.stemmed_keyword_map = {}
-        self.rule_embeddings = {}
+        self.nlp_plan = {'tier': 'none', 'disable': []}
+        self.keyword_automaton = KeywordAutomaton()
+        self.fuzzy_index = FuzzyKeywordIndex([], DEFAULT_EDIT_DISTANCE_THRESHOLD)
         self.rule_patterns = {}
+        self.pattern_matcher = PatternMatcher()
+        self.build_stats = {}
+        # Semantic index: one L2-normalized row per example, grouped by rule.
+        # rule_offsets[i] is the first row of semantic_rules[i] in example_matrix.
+        self.example_matrix = np.zeros((0, 0), dtype=np.float32)
+        self.rule_offsets = np.zeros(0, dtype=np.int64)
+        self.semantic_index = SemanticIndex(self.example_matrix, self.rule_offsets)
+        self.semantic_rules = []
+        self.semantic_thresholds = np.zeros(0, dtype=np.float32)
+
+    def build(self):
+        """Precompute indices for efficient matching"""
+        pattern_matcher = PatternMatcher()
+        self.build_stats = {'keywords': 0.0, 'synonyms': 0.0, 'lemmas': 0.0, 'patterns': 0.0, 'embeddings': 0.0}
+        semantic_rules = []
 
         for rule in self.rules:
             rule_id = rule.get('id')
@@ -190,33 +2227,252 @@ class RuleManager:
                 logger.warning(f"Rule missing ID, skipping: {rule}")
                 continue
                 
-            # Process keywords with improved handling
+            # Process keywords with improved handling (synonym time is tracked separately)
+            stage_start = time.perf_counter()
             self._process_keywords(rule)
+            self.build_stats['keywords'] += time.perf_counter() - stage_start
             
             # Process regex patterns if present
+            stage_start = time.perf_counter()
             if 'patterns' in rule:
-                try:
-                    compiled_patterns = []
-                    for pattern in rule['patterns']:
-                        compiled_patterns.append(re.compile(pattern, re.IGNORECASE))
+                compiled_patterns = []
+                for pattern in rule['patterns']:
+                    try:
+                        compiled = pattern_matcher.add(rule_id, pattern)
+                        if compiled is not None:
+                            compiled_patterns.append(compiled)
+                    except Exception as e:
+                        logger.error(f"Error compiling regex for rule {rule_id}: {str(e)}")
+                if compiled_patterns:
                     self.rule_patterns[rule_id] = compiled_patterns
-                except Exception as e:
-                    logger.error(f"Error compiling regex for rule {rule_id}: {str(e)}")
+            self.build_stats['patterns'] += time.perf_counter() - stage_start
             
-            # Process embeddings for semantic matching
+            # Collect examples for semantic matching; they are encoded together below
             if 'examples' in rule and rule['examples']:
-                try:
-                    rule_embs = [model.encode(ex) for ex in rule['examples']]
-                    self.rule_embeddings[rule_id] = {
-                        'embeddings': rule_embs,
-                        'threshold': rule.get('threshold', DEFAULT_SIMILARITY_THRESHOLD),
-                        'examples': rule['examples']
-                    }
-                except Exception as e:
-                    logger.error(f"Error creating embeddings for rule {rule_id}: {str(e)}")
+                semantic_rules.append({
+                    'rule_id': rule_id,
+                    'threshold': rule.get('threshold', DEFAULT_SIMILARITY_THRESHOLD),
+                    'examples': rule['examples']
+                })
+
+        # Merge all rule patterns into combined regexes
+        stage_start = time.perf_counter()
+        pattern_matcher.build()
+        self.pattern_matcher = pattern_matcher
+        self.build_stats['patterns'] += time.perf_counter() - stage_start
+
+        # Compile every keyword, synonym and stem form into one automaton
+        stage_start = time.perf_counter()
+        self._build_execution_plan()
+        self._build_keyword_automaton()
+        self.fuzzy_index = FuzzyKeywordIndex(self.keyword_map, DEFAULT_EDIT_DISTANCE_THRESHOLD)
+        self.build_stats['keywords'] += time.perf_counter() - stage_start
+
+        # Process embeddings for semantic matching in large batches across all rules
+        stage_start = time.perf_counter()
+        try:
+            examples = [ex for rule in semantic_rules for ex in rule['examples']]
+            self._build_semantic_index(semantic_rules, self._encode_examples(examples))
+        except Exception as e:
+            logger.error(f"Error creating rule embeddings: {str(e)}")
+            self._build_semantic_index([], None)
+        self.build_stats['embeddings'] = time.perf_counter() - stage_start
+        self.build_stats['keywords'] -= self.build_stats['synonyms'] + self.build_stats['lemmas']
                     
         logger.info(f"Precomputed {len(self.keyword_map)} keywords, {len(self.rule_patterns)} " 
-                   f"patterns, and {len(self.rule_embeddings)} rule embeddings")
+                   f"patterns, and {len(self.semantic_rules)} rule embeddings "
+                   f"({self.example_matrix.shape[0]} examples)")
+        logger.info("Ruleset build time: " + ", ".join(
+            f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in self.build_stats.items()
+        ))
+
+    def _build_execution_plan(self):
+        """Decide how much of the spaCy pipeline requests need for the loaded rules.
+
+        Tiers: "none" when no rule has keywords (spaCy is skipped), "tokens"
+        when every keyword rule is exact-match only (a regex tokenizer is
+        enough), and "lemmas" otherwise. The lemmatizer is rule-based and needs
+        POS tags, so the "lemmas" tier keeps tok2vec, tagger and
+        attribute_ruler; the parser and NER are never used.
+        """
+        rule_infos = [info for infos in self.keyword_map.values() for info in infos]
+        if not rule_infos:
+            tier = 'none'
+        elif all(info['exact_only'] for info in rule_infos):
+            tier = 'tokens'
+        else:
+            tier = 'lemmas'
+
+        required = NLP_LEMMA_COMPONENTS if tier == 'lemmas' else set()
+        disable = [name for name in nlp.pipe_names if name not in required]
+        self.nlp_plan = {'tier': tier, 'disable': disable}
+        logger.info(f"NLP execution plan: {tier} tier, disabled components: {', '.join(disable) or 'none'}")
+
+    def _tokenize(self, text_lower):
+        """Return (tokens, stop flags, lemmas or None) using only the planned pipeline"""
+        tier = self.nlp_plan['tier']
+        if tier == 'none':
+            return [], [], None
+        cached = feature_cache.get_tokens(text_lower, tier)
+        if cached is not None:
+            return cached
+        if tier == 'tokens':
+            tokens = TOKEN_RE.findall(text_lower)
+            tokenized = tokens, [token in nlp.Defaults.stop_words for token in tokens], None
+        else:
+            tokenized = self._doc_tokens(nlp(text_lower, disable=self.nlp_plan['disable']))
+        feature_cache.put_tokens(text_lower, tier, tokenized)
+        return tokenized
+
+    def _tokenize_batch(self, texts_lower):
+        """_tokenize for many texts, with a single nlp.pipe pass over the uncached ones when spaCy is needed"""
+        tier = self.nlp_plan['tier']
+        if tier != 'lemmas':
+            return [self._tokenize(text) for text in texts_lower]
+        tokenized = [feature_cache.get_tokens(text, tier) for text in texts_lower]
+        missing = [i for i, cached in enumerate(tokenized) if cached is None]
+        docs = nlp.pipe([texts_lower[i] for i in missing], disable=self.nlp_plan['disable'])
+        for i, doc in zip(missing, docs):
+            tokenized[i] = self._doc_tokens(doc)
+            feature_cache.put_tokens(texts_lower[i], tier, tokenized[i])
+        return tokenized
+
+    @staticmethod
+    def _doc_tokens(doc):
+        kept = [t for t in doc if not (t.is_punct or t.is_space) and t.text.strip()]
+        return [t.text for t in kept], [t.is_stop for t in kept], [t.lemma_.lower() for t in kept]
+
+    def _build_keyword_automaton(self):
+        """Compile keyword, lemma and stem forms, tagged with their match type, into one automaton"""
+        automaton = KeywordAutomaton()
+        # Only keywords of rules that accept variants need a lemma form
+        variant_keywords = [
+            kw for kw, rule_infos in self.keyword_map.items()
+            if any(not info['exact_only'] for info in rule_infos)
+        ]
+        lemma_start = time.perf_counter()
+        lemmas = dict(zip(variant_keywords, TokenNormalizer.lemmatize_phrases(variant_keywords)))
+        self.build_stats['lemmas'] += time.perf_counter() - lemma_start
+
+        for kw, rule_infos in self.keyword_map.items():
+            kw_normalized = KeywordAutomaton.normalize(kw)
+            lemma = KeywordAutomaton.normalize(lemmas.get(kw, ""))
+            for rule_info in rule_infos:
+                automaton.add(kw_normalized, ('keyword', rule_info))
+                # Lets "stock" in the text match the keyword "stocks" through the lemma view
+                if lemma and lemma != kw_normalized and not rule_info['exact_only']:
+                    automaton.add(lemma, ('lemma', dict(rule_info, original=kw)))
+        for stemmed_kw, rule_infos in self.stemmed_keyword_map.items():
+            for rule_info in rule_infos:
+                automaton.add(KeywordAutomaton.normalize(stemmed_kw), ('stem', rule_info))
+        automaton.build()
+        self.keyword_automaton = automaton
+
+    def _encode_examples(self, examples):
+        """Encode examples, reusing stored embeddings, and return them in input order"""
+        if not examples:
+            return None
+
+        if embedding_store is None:
+            return self._encode_batched(examples)
+
+        # Only examples that are new or edited since the last build reach the model
+        stored, missing = embedding_store.lookup(examples)
+        logger.info(f"Embedding store hit for {len(examples) - len(missing)}/{len(examples)} examples")
+        if missing:
+            encoded = self._encode_batched([examples[i] for i in missing])
+            for i, emb in zip(missing, encoded):
+                stored[i] = emb
+            try:
+                embedding_store.save([examples[i] for i in missing], encoded, examples)
+            except Exception as e:
+                logger.warning(f"Embedding store update failed: {str(e)}")
+        return np.asarray(stored, dtype=np.float32)
+
+    def _encode_batched(self, examples):
+        """Encode examples in length-sorted batches and return them in input order"""
+        # Sorting by length keeps padding per batch small
+        order = sorted(range(len(examples)), key=lambda i: len(examples[i]))
+        embeddings = None
+        total = len(examples)
+
+        for batch_start in range(0, total, ENCODE_BATCH_SIZE):
+            batch_idx = order[batch_start:batch_start + ENCODE_BATCH_SIZE]
+            batch_embs = np.asarray(model.encode(
+                [examples[i] for i in batch_idx],
+                batch_size=ENCODE_BATCH_SIZE,
+                show_progress_bar=False
+            ), dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.empty((total, batch_embs.shape[1]), dtype=np.float32)
+            embeddings[batch_idx] = batch_embs
+
+            done = min(batch_start + ENCODE_BATCH_SIZE, total)
+            logger.info(f"Encoded {done}/{total} rule examples")
+
+        return embeddings
+
+    def _build_semantic_index(self, semantic_rules, embeddings):
+        """Normalize the stacked example embeddings and build the semantic index"""
+        if not semantic_rules:
+            self.example_matrix = np.zeros((0, 0), dtype=np.float32)
+            self.rule_offsets = np.zeros(0, dtype=np.int64)
+            self.semantic_index = SemanticIndex(self.example_matrix, self.rule_offsets)
+            self.semantic_rules = []
+            self.semantic_thresholds = np.zeros(0, dtype=np.float32)
+            return
+
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0  # Leave all-zero rows as zero similarity
+        matrix /= norms
+
+        sizes = [len(rule['examples']) for rule in semantic_rules]
+        self.example_matrix = matrix
+        self.rule_offsets = np.concatenate(([0], np.cumsum(sizes)[:-1])).astype(np.int64)
+        self.semantic_rules = semantic_rules
+        self.semantic_thresholds = np.array(
+            [r['threshold'] for r in semantic_rules], dtype=np.float32
+        )
+        self.semantic_index = make_semantic_index(SEMANTIC_INDEX_BACKEND, matrix, self.rule_offsets,
+                                                  float(self.semantic_thresholds.min()))
+        logger.info(f"Built {self.semantic_index.name} semantic index over {matrix.shape[0]} examples")
+
+    def semantic_matches(self, text_emb):
+        """Return (rule, similarity, example index, top examples) for every rule above its threshold.
+
+        Top examples are up to SEMANTIC_TOP_K (example index, similarity) pairs
+        of the rule, best first, or empty when SEMANTIC_TOP_K is 1 or less.
+        """
+        return self.semantic_matches_batch([text_emb])[0]
+
+    def semantic_matches_batch(self, text_embs):
+        """Return semantic_matches for every row of a texts x dimensions embedding matrix"""
+        queries = np.atleast_2d(np.asarray(text_embs, dtype=np.float32))
+        results = [[] for _ in range(len(queries))]
+        if not self.semantic_rules:
+            return results
+
+        # All-zero embeddings match nothing
+        norms = np.linalg.norm(queries, axis=1)
+        valid = np.flatnonzero(norms > 0)
+        if len(valid) == 0:
+            return results
+        queries = queries[valid] / norms[valid, None]
+
+        # One texts x examples similarity matrix, then a max per rule segment
+        max_sims, best_rows = self.semantic_index.best_per_rule_batch(queries)
+        hits = max_sims > self.semantic_thresholds
+        for row, text_pos in enumerate(valid):
+            for i in np.flatnonzero(hits[row]):
+                max_idx = int(best_rows[row, i] - self.rule_offsets[i])
+                top = []
+                if SEMANTIC_TOP_K > 1:
+                    # Exact over the matched rule's own rows only, so other rules can't crowd it out
+                    top = [(example_row - int(self.rule_offsets[i]), similarity) for example_row, similarity
+                           in self.semantic_index.top_examples(queries[row], i, SEMANTIC_TOP_K)]
+                results[text_pos].append((self.semantic_rules[i], float(max_sims[row, i]), max_idx, top))
+        return results
 
     def _process_keywords(self, rule):
         """Process and expand keywords with improved handling"""
@@ -231,6 +2487,9 @@ class RuleManager:
         # Get rule category for better organization
         category = rule.get('category', 'general')
         
+        # "exact" rules match keywords verbatim only: no lemma, stem or fuzzy variants
+        exact_only = rule.get('keyword_match', 'full') == 'exact'
+        
         # Track expanded keywords to avoid duplication
         expanded_keywords = set()
         
@@ -246,7 +2505,9 @@ class RuleManager:
             
             # Add synonyms with limit on number
             if rule.get('expand_synonyms', False):
+                synonym_start = time.perf_counter()
                 synonyms = self.get_wordnet_synonyms(kw_lower)
+                self.build_stats['synonyms'] += time.perf_counter() - synonym_start
                 # Limit number of synonyms to avoid overexpansion
                 for syn in list(synonyms)[:5]:  
                     if len(syn) >= 3:  # Only add synonyms of reasonable length
@@ -260,12 +2521,16 @@ class RuleManager:
             # Original keyword map
             self.keyword_map.setdefault(kw, []).append({
                 'rule_id': rule_id,
-                'category': category
+                'category': category,
+                'exact_only': exact_only
             })
+            if exact_only:
+                continue
             
-            # Stemmed keyword map
-            stemmed_kw = stemmer.stem(kw)
-            if stemmed_kw != kw and len(stemmed_kw) >= 3:
+            # Stemmed keyword map (phrases are stemmed word by word)
+            kw_normalized = KeywordAutomaton.normalize(kw)
+            stemmed_kw = " ".join(token_normalizer.stem(w) for w in kw_normalized.split())
+            if stemmed_kw != kw_normalized and len(stemmed_kw) >= 3:
                 self.stemmed_keyword_map.setdefault(stemmed_kw, []).append({
                     'rule_id': rule_id,
                     'category': category,
@@ -287,35 +2552,6 @@ class RuleManager:
             logger.warning(f"Error getting synonyms for {word}: {str(e)}")
             return set()
 
-    def check_with_cache(self, text):
-        """Check rules with caching"""
-        if not text or not text.strip():
-            return {"violations": []}
-            
-        # Create a deterministic hash for the cache key
-        cache_key = f"guard:{hashlib.md5(text.encode()).hexdigest()}"
-        
-        # Try to get from cache if Redis is available
-        if use_redis:
-            try:
-                cached_result = redis_client.get(cache_key)
-                if cached_result:
-                    return json.loads(cached_result)
-            except Exception as e:
-                logger.warning(f"Redis get error: {str(e)}")
-        
-        # Perform the full check
-        result = self.full_check(text)
-        
-        # Cache the result if Redis is available
-        if use_redis:
-            try:
-                redis_client.setex(cache_key, CACHE_EXPIRY, json.dumps(result))
-            except Exception as e:
-                logger.warning(f"Redis set error: {str(e)}")
-            
-        return result
-
     def check_fuzzy_keywords(self, word):
         """Improved fuzzy keyword matching with length-dependent threshold"""
         if not word or len(word) < self.min_word_length_for_fuzzy:
@@ -338,118 +2574,113 @@ class RuleManager:
         if len(word_lower) < 4:
             max_distance = 0
             
-        # Check against keyword dictionary
-        for keyword in self.keyword_map:
-            # Skip if keyword is too different in length
-            if abs(len(keyword) - len(word_lower)) > max_distance:
-                continue
-                
-            # Calculate edit distance
-            edit_dist = distance(word_lower, keyword)
+        # Look up keywords within the allowed distance in the deletion index
+        for keyword, edit_dist in self.fuzzy_index.lookup(word_lower, max_distance):
+            confidence = 1.0 - (edit_dist / max(len(keyword), 1))
             
-            # Only match if within threshold
-            if edit_dist <= max_distance:
-                confidence = 1.0 - (edit_dist / max(len(keyword), 1))
-                
-                # Higher threshold for shorter words
-                min_confidence = 0.7 if len(word_lower) < 5 else 0.6
-                
-                if confidence >= min_confidence:
-                    for rule_info in self.keyword_map[keyword]:
-                        matches.append({
-                            "rule_id": rule_info['rule_id'],
-                            "type": "fuzzy_keyword",
-                            "original": word_lower,
-                            "matched": keyword,
-                            "confidence": round(confidence, 2),
-                            "category": rule_info['category']
-                        })
+            # Higher threshold for shorter words
+            min_confidence = 0.7 if len(word_lower) < 5 else 0.6
+            
+            if confidence >= min_confidence:
+                for rule_info in self.keyword_map[keyword]:
+                    if rule_info['exact_only']:
+                        continue
+                    matches.append({
+                        "rule_id": rule_info['rule_id'],
+                        "type": "fuzzy_keyword",
+                        "original": word_lower,
+                        "matched": keyword,
+                        "confidence": round(confidence, 2),
+                        "category": rule_info['category']
+                    })
         
         return matches
 
     def full_check(self, text):
         """Perform comprehensive rule checking with improved accuracy"""
+        stages = self._rule_stages(text)
+        if stages['needs_semantic']:
+            try:
+                stages['violations'] = self._semantic_stage(self._embed(stages['text_lower']))
+            except Exception as e:
+                logger.warning(f"Semantic matching error: {str(e)}")
+        return self._build_result(stages)
+
+    def full_check_batch(self, texts):
+        """full_check for many texts: one nlp.pipe pass, one encode call and one similarity matrix"""
+        return self._semantic_batch(self.rule_stages_batch(texts))
+
+    def rule_stages_batch(self, texts, tokenized=None):
+        """_rule_stages for many texts, sharing one nlp.pipe pass over those without token features"""
+        tokenized = list(tokenized) if tokenized is not None else [None] * len(texts)
+        missing = [i for i, text_tokens in enumerate(tokenized) if text_tokens is None]
+        for i, text_tokens in zip(missing, self._tokenize_batch([texts[i].lower() for i in missing])):
+            tokenized[i] = text_tokens
+        return [self._rule_stages(text, text_tokens) for text, text_tokens in zip(texts, tokenized)]
+
+    def _semantic_batch(self, stages):
+        """Run the semantic stage for every text that needs it with one encode call, then build results"""
+        semantic = [text_stages for text_stages in stages if text_stages['needs_semantic']]
+        if semantic:
+            try:
+                embeddings = self._embed_batch([text_stages['text_lower'] for text_stages in semantic])
+                for text_stages, matches in zip(semantic, self.semantic_matches_batch(embeddings)):
+                    text_stages['violations'] = self._semantic_violations(matches)
+            except Exception as e:
+                logger.warning(f"Semantic matching error: {str(e)}")
+        return [self._build_result(text_stages) for text_stages in stages]
+
+    def _embed(self, text_lower):
+        """Encode one text, going through the feature cache"""
+        return self._embed_batch([text_lower])[0]
+
+    def _embed_batch(self, texts_lower):
+        """Return a texts x dimensions float32 matrix, encoding only the texts not in the feature cache"""
+        cached = [feature_cache.get_embedding(text) for text in texts_lower]
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        if missing:
+            encoded = model.encode([texts_lower[i] for i in missing],
+                                   batch_size=ENCODE_MAX_BATCH, show_progress_bar=False)
+            for i, embedding in zip(missing, encoded):
+                cached[i] = np.asarray(embedding, dtype=np.float32)
+                feature_cache.put_embedding(texts_lower[i], cached[i])
+        return np.stack(cached)
+
+    def _rule_stages(self, text, tokenized=None):
+        """Run the pattern and keyword stages and decide whether the semantic stage is needed"""
         violations = []
+        pattern_timeouts = set()
         processed_violations = set()  # Track processed violations to avoid duplication
         
         # Normalize and process text
         text_lower = text.lower()
         text_clean = re.sub(r'[^\w\s]', ' ', text_lower)  # Replace punctuation with space
         
-        # Apply spaCy for better NLP processing
-        doc = nlp(text_lower)
-        
-        # Extract important components
-        words = [token.text for token in doc if not token.is_stop and token.text.strip()]
-        lemmas = [token.lemma_ for token in doc if not token.is_stop and token.lemma_.strip()]
-        tokens_with_pos = [(token.text, token.pos_) for token in doc]
-        
-        # 1. Check regex patterns first (most specific)
-        for rule_id, patterns in self.rule_patterns.items():
-            for pattern in patterns:
-                matches = pattern.finditer(text_lower)
-                for match in matches:
-                    match_text = match.group(0)
-                    if match_text:
-                        violation_key = f"{rule_id}:pattern:{match_text}"
-                        if violation_key not in processed_violations:
-                            violations.append({
-                                "rule_id": rule_id,
-                                "type": "pattern",
-                                "matched": match_text,
-                                "confidence": 1.0
-                            })
-                            processed_violations.add(violation_key)
-        
-        # 2. Direct keyword check
-        for word in words:
-            if word in self.keyword_map:
-                for rule_info in self.keyword_map[word]:
-                    violation_key = f"{rule_info['rule_id']}:keyword:{word}"
-                    if violation_key not in processed_violations:
-                        violations.append({
-                            "rule_id": rule_info['rule_id'],
-                            "type": "keyword",
-                            "matched": word,
-                            "confidence": 1.0,
-                            "category": rule_info['category']
-                        })
-                        processed_violations.add(violation_key)
+        # Run only the spaCy components the loaded rules need
+        tokenized = tokenized or self._tokenize(text_lower)
+        tokens, stop_flags, lemmas = tokenized
+        words = [token for token, is_stop in zip(tokens, stop_flags) if not is_stop]
         
-        # 3. Lemmatized keyword check (only if no exact matches for the word)
-        for lemma in lemmas:
-            if lemma in self.keyword_map:
-                for rule_info in self.keyword_map[lemma]:
-                    violation_key = f"{rule_info['rule_id']}:lemma:{lemma}"
-                    if violation_key not in processed_violations:
-                        violations.append({
-                            "rule_id": rule_info['rule_id'],
-                            "type": "lemma_keyword",
-                            "matched": lemma,
-                            "confidence": 0.95,
-                            "category": rule_info['category']
-                        })
-                        processed_violations.add(violation_key)
+        # 1. Check regex patterns first (most specific), all rules in one scan
+        for rule_id, match_text in self.pattern_matcher.finditer(text_lower, pattern_timeouts):
+            violation_key = f"{rule_id}:pattern:{match_text}"
+            if violation_key not in processed_violations:
+                violations.append({
+                    "rule_id": rule_id,
+                    "type": "pattern",
+                    "matched": match_text,
+                    "confidence": 1.0
+                })
+                processed_violations.add(violation_key)
         
-        # 4. Stemmed keyword check
-        stemmed_words = [stemmer.stem(word) for word in words]
-        for stemmed_word in stemmed_words:
-            if stemmed_word in self.stemmed_keyword_map:
-                for rule_info in self.stemmed_keyword_map[stemmed_word]:
-                    violation_key = f"{rule_info['rule_id']}:stemmed:{stemmed_word}"
-                    if violation_key not in processed_violations:
-                        violations.append({
-                            "rule_id": rule_info['rule_id'],
-                            "type": "stemmed_keyword",
-                            "matched": stemmed_word,
-                            "confidence": 0.9,
-                            "details": {"original_keyword": rule_info.get('original', stemmed_word)},
-                            "category": rule_info['category']
-                        })
-                        processed_violations.add(violation_key)
+        # 2-4. Direct, lemmatized and stemmed keyword checks in one automaton pass
+        for violation_key, violation in self._keyword_violations(tokens, stop_flags, lemmas):
+            if violation_key not in processed_violations:
+                violations.append(violation)
+                processed_violations.add(violation_key)
         
         # 5. Fuzzy keyword matching (only if no exact matches and text isn't too short)
-        if len(violations) == 0 and len(text_clean) >= 4:
+        if len(violations) == 0 and len(text_clean) >= 4 and lemmas is not None:
             for word in words:
                 if len(word) >= self.min_word_length_for_fuzzy and word not in self.whitelist:
                     fuzzy_matches = self.check_fuzzy_keywords(word)
@@ -460,44 +2691,437 @@ class RuleManager:
                             processed_violations.add(violation_key)
         
         # 6. Semantic similarity check (only if no keyword matches and text is substantial)
-        if len(violations) == 0 and len(text_clean.split()) >= 3:
-            try:
-                text_emb = model.encode(text_lower)
-                for rule_id, data in self.rule_embeddings.items():
-                    similarities = np.dot(data['embeddings'], text_emb) / (
-                        np.linalg.norm(data['embeddings'], axis=1) * np.linalg.norm(text_emb)
-                    )
-                    max_sim = np.max(similarities)
-                    max_idx = np.argmax(similarities)
+        needs_semantic = len(violations) == 0 and len(text_clean.split()) >= 3
+        return {
+            'violations': violations,
+            'text_lower': text_lower,
+            'needs_semantic': needs_semantic,
+            'pattern_timeouts': pattern_timeouts,
+            'tokenized': tokenized
+        }
+
+    def _keyword_violations(self, tokens, stop_flags, lemmas):
+        """Yield (violation key, violation) for keyword matches in the surface, lemma and stem views.
+
+        The views are joined into one scan string, one line per view, so a
+        single automaton pass covers all of them. Without lemmas (exact-match
+        rules only) just the surface view is scanned. Single-word matches on
+        stop words are ignored, as the token-based checks always did.
+        """
+        if not tokens:
+            return
+        views = [('keyword', tokens)]
+        if lemmas is not None:
+            views.append(('lemma_keyword', lemmas))
+            views.append(('stemmed_keyword', [
+                token if is_stop else token_normalizer.stem(token)
+                for token, is_stop in zip(tokens, stop_flags)
+            ]))
+
+        lines = []
+        view_starts = []
+        stop_starts = set()
+        offset = 0
+        for view, forms in views:
+            view_starts.append((offset, view))
+            for is_stop, form in zip(stop_flags, forms):
+                if is_stop:
+                    stop_starts.add(offset)
+                offset += len(form) + 1
+            lines.append(" ".join(forms))
+        stream = "\n".join(lines)
+
+        view_index = 0
+        for start, _, pattern in self.keyword_automaton.iter_matches(stream):
+            while view_index + 1 < len(view_starts) and start >= view_starts[view_index + 1][0]:
+                view_index += 1
+            view = view_starts[view_index][1]
+            if " " not in pattern and start in stop_starts:
+                continue
+
+            for form, rule_info in self.keyword_automaton.entries[pattern]:
+                rule_id = rule_info['rule_id']
+                if view == 'keyword' and form == 'keyword':
+                    yield f"{rule_id}:keyword:{pattern}", {
+                        "rule_id": rule_id,
+                        "type": "keyword",
+                        "matched": pattern,
+                        "confidence": 1.0,
+                        "category": rule_info['category']
+                    }
+                elif view == 'lemma_keyword' and form in ('keyword', 'lemma') and not rule_info['exact_only']:
+                    yield f"{rule_id}:lemma:{pattern}", {
+                        "rule_id": rule_id,
+                        "type": "lemma_keyword",
+                        "matched": rule_info.get('original', pattern),
+                        "confidence": 0.95,
+                        "category": rule_info['category']
+                    }
+                elif view == 'stemmed_keyword' and form == 'stem':
+                    yield f"{rule_id}:stemmed:{pattern}", {
+                        "rule_id": rule_id,
+                        "type": "stemmed_keyword",
+                        "matched": pattern,
+                        "confidence": 0.9,
+                        "details": {"original_keyword": rule_info.get('original', pattern)},
+                        "category": rule_info['category']
+                    }
+
+    def _semantic_stage(self, text_emb):
+        """Return semantic violations for an encoded text"""
+        return self._semantic_violations(self.semantic_matches(text_emb))
+
+    @staticmethod
+    def _semantic_violations(matches):
+        """Build semantic violations from semantic_matches output"""
+        violations = []
+        for data, max_sim, max_idx, top in matches:
+            # Find which example matched
+            example = data['examples'][max_idx] if max_idx < len(data['examples']) else "Unknown"
+            details = {
+                "similarity": float(max_sim),
+                "matched_example": example
+            }
+            if top:
+                details["top_examples"] = [
+                    {"example": data['examples'][idx], "similarity": similarity} for idx, similarity in top
+                ]
+            violations.append({
+                "rule_id": data['rule_id'],
+                "type": "semantic",
+                "confidence": float(max_sim),
+                "matched": "semantic similarity",
+                "details": details
+            })
+        return violations
+
+    @staticmethod
+    def _build_result(stages):
+        """Sort violations by confidence, keep the top ones and flag timed-out patterns"""
+        violations = sorted(stages['violations'], key=lambda x: x.get('confidence', 0), reverse=True)
+        
+        # Limit to top violations
+        result = {"violations": violations[:10]}  # Limit to prevent overload
+        if stages['pattern_timeouts']:
+            result["pattern_timeout"] = sorted(stages['pattern_timeouts'])
+        return result
+
+
+class RuleManager:
+    def __init__(self):
+        self.rules = []
+        self.ruleset = RuleSet()  # Replaced whole on every reload; read it once per check
+        self.last_reload_time = 0
+        self.generation = 0  # Bumped on every rebuild, so pools can tell stale workers
+        # Content hash of rules, config and model; part of every cache key
+        self.ruleset_version = None
+        self.cache_prefix = ""
+        self.warmup_task = None
+        self.inflight = SingleFlight("rule_check")
+        self.refresh_tasks = set()
+        self.refreshing = set()  # Cache keys with a background refresh scheduled or running
+
+    def load_rules(self, filepath, force_reload=False):
+        """Load rules with modification time checking and precompute embeddings"""
+        try:
+            # Check if file has been modified
+            if os.path.exists(filepath):
+                current_mtime = os.path.getmtime(filepath)
+                if not force_reload and current_mtime <= self.last_reload_time:
+                    return  # File hasn't changed, no need to reload
+                
+                with open(filepath) as f:
+                    data = json.load(f)
                     
-                    if max_sim > data['threshold']:
-                        # Find which example matched
-                        example = data['examples'][max_idx] if max_idx < len(data['examples']) else "Unknown"
-                        
-                        violation_key = f"{rule_id}:semantic:{max_idx}"
-                        if violation_key not in processed_violations:
-                            violations.append({
-                                "rule_id": rule_id,
-                                "type": "semantic",
-                                "confidence": float(max_sim),
-                                "matched": "semantic similarity",
-                                "details": {
-                                    "similarity": float(max_sim),
-                                    "matched_example": example
-                                }
-                            })
-                            processed_violations.add(violation_key)
-            except Exception as e:
-                logger.warning(f"Semantic matching error: {str(e)}")
+                    # Load optional configuration
+                    config = data.get('config', {})
+                    
+                    ruleset = RuleSet(data.get('rules', []), config)
+                    ruleset.build()
+                    self._publish(ruleset, config)
+                    self.last_reload_time = current_mtime
+                    
+                logger.info(f"Loaded {len(self.rules)} rules from {filepath}")
+            else:
+                logger.error(f"Rules file not found: {filepath}")
+                # Load empty rules to continue operating
+                ruleset = RuleSet()
+                ruleset.build()
+                self._publish(ruleset, {})
+        except Exception as e:
+            logger.error(f"Error loading rules: {str(e)}")
+            # Don't raise - continue with existing rules if any
+
+    def _publish(self, ruleset, config):
+        """Swap in a fully built ruleset; checks already running keep the one they started with"""
+        self.ruleset = ruleset
+        self.rules = ruleset.rules
+        self.generation += 1
+        self._set_ruleset_version(config)
+
+    def full_check(self, text):
+        return self.ruleset.full_check(text)
+
+    def full_check_batch(self, texts):
+        return self.ruleset.full_check_batch(texts)
+
+    def _set_ruleset_version(self, config):
+        """Hash everything that can change a verdict, so reloads switch to fresh cache keys"""
+        identity = {
+            "rules": self.rules,
+            "config": config,
+            "model": MODEL_NAME,
+            "embedding": EMBEDDING_VERSION,
+            "semantic_index": SEMANTIC_INDEX_BACKEND,
+            "app": app.version
+        }
+        self.ruleset_version = hashlib.sha256(
+            json.dumps(identity, sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+        namespace = config.get('cache_namespace', CACHE_NAMESPACE)
+        self.cache_prefix = f"{namespace}:{self.ruleset_version}" if namespace else self.ruleset_version
+        logger.info(f"Ruleset version {self.ruleset_version}")
+
+    async def check_with_cache(self, text):
+        """Check rules with caching"""
+        if not text or not text.strip():
+            return {"violations": []}
+            
+        self.sync_cache_version()
+        result_cache.remember(text)
+        cache_key = self._cache_key(text)
         
-        # Sort violations by confidence
-        violations = sorted(violations, key=lambda x: x.get('confidence', 0), reverse=True)
+        # Local tier first, then Redis
+        entry = await result_cache.get(cache_key)
+        if entry is not None:
+            if result_cache.needs_refresh(entry):
+                self._refresh_stale([text], [cache_key])
+            return entry["result"]
         
-        # Limit to top violations
-        return {"violations": violations[:10]}  # Limit to prevent overload
+        # Identical concurrent checks in this process share one computation
+        return await self.inflight.do(cache_key, partial(self._check_and_cache, text, cache_key))
+
+    async def _check_and_cache(self, text, cache_key):
+        """Compute and cache a verdict, unless another worker holding the key's lock delivers it first"""
+        lock_token = await result_cache.acquire_lock(cache_key)
+        if lock_token is None:
+            result = await result_cache.wait_for(cache_key)
+            if result is not None:
+                metrics.inc("rule_check_remote_coalesced")
+                return result
+        
+        try:
+            # Perform the full check
+            start = time.perf_counter()
+            result = await self.full_check_async(text)
+            
+            # Cache the result in both tiers
+            result_cache.set(cache_key, result, time.perf_counter() - start)
+        finally:
+            if lock_token is not None:
+                result_cache.release_lock(cache_key, lock_token)
+        return result
+
+    def _cache_key(self, text):
+        """Create a deterministic cache key, scoped to the loaded ruleset version"""
+        return f"guard:{self.cache_prefix}:{hashlib.md5(text.encode()).hexdigest()}"
+
+    def sync_cache_version(self):
+        """Point the result cache at the current ruleset, warming it in the background after a change"""
+        previous = result_cache.version
+        if previous == self.cache_prefix:
+            return
+        recent_texts = result_cache.switch_version(self.cache_prefix, self.rules)
+        if previous is None or not recent_texts:
+            return  # Nothing to warm on first load
+        if self.warmup_task is not None and not self.warmup_task.done():
+            self.warmup_task.cancel()
+        self.warmup_task = asyncio.create_task(self._warm_cache(self.cache_prefix, recent_texts))
+
+    async def _warm_cache(self, version, texts):
+        """Re-check recent texts under a new ruleset, one small batch at a time.
 
-# Initialize rule manager
+        Only one batch is in the rule pool at once and saturation backs off,
+        so live traffic keeps priority and the engine is not stampeded.
+        """
+        start = time.perf_counter()
+        warmed = 0
+        try:
+            for i in range(0, len(texts), CACHE_WARMUP_BATCH):
+                if self.cache_prefix != version:
+                    return  # Superseded by a newer reload
+                chunk = texts[i:i + CACHE_WARMUP_BATCH]
+                while True:
+                    try:
+                        await self.check_batch_with_cache(chunk)
+                        break
+                    except RuleEvaluatorSaturated:
+                        await asyncio.sleep(0.1)
+                warmed += len(chunk)
+                metrics.inc("cache_warmup_texts", len(chunk))
+        except Exception as e:
+            logger.error(f"Cache warm-up error: {str(e)}")
+        finally:
+            logger.info(f"Cache warm-up for {version}: {warmed}/{len(texts)} texts "
+                        f"in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    async def check_batch_with_cache(self, texts):
+        """check_with_cache for many texts: one cache read, one batched check of the misses, one cache write"""
+        results = [None] * len(texts)
+        positions = {}  # Unique non-empty text -> its positions in the batch
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                results[i] = {"violations": []}
+            else:
+                positions.setdefault(text, []).append(i)
+
+        unique_texts = list(positions)
+        self.sync_cache_version()
+        # Keys are fixed up front, so results land under the version they were computed with
+        cache_keys = {text: self._cache_key(text) for text in unique_texts}
+        for text in unique_texts:
+            result_cache.remember(text)
+        if unique_texts:
+            entries = await result_cache.get_many([cache_keys[text] for text in unique_texts])
+            stale = []
+            for text, entry in zip(unique_texts, entries):
+                if entry is not None:
+                    for i in positions[text]:
+                        results[i] = entry["result"]
+                    if result_cache.needs_refresh(entry):
+                        stale.append(text)
+            if stale:
+                self._refresh_stale(stale, [cache_keys[text] for text in stale])
+
+        misses = [text for text in unique_texts if results[positions[text][0]] is None]
+        if not misses:
+            return results
+
+        # Misses already being computed elsewhere in this process are shared, the rest run as one batch
+        texts_by_key = {cache_keys[text]: text for text in misses}
+        computed = await self.inflight.do_many(
+            [cache_keys[text] for text in misses],
+            lambda keys: self._check_batch_and_cache([texts_by_key[key] for key in keys], keys)
+        )
+        for text, result in zip(misses, computed):
+            for i in positions[text]:
+                results[i] = result
+        return results
+
+    async def _check_batch_and_cache(self, texts, cache_keys):
+        """Compute and cache verdicts for texts with the batched pipeline"""
+        # Rule checks run in the rule pool and encoding in the executor, both off the event loop
+        start = time.perf_counter()
+        ruleset = self.ruleset
+        stages = await self._pool_rule_stages(evaluate_rule_stages_batch, texts, ruleset)
+        loop = asyncio.get_running_loop()
+        computed = await loop.run_in_executor(executor, ruleset._semantic_batch, stages)
+        delta = (time.perf_counter() - start) / max(len(texts), 1)
+        for cache_key, result in zip(cache_keys, computed):
+            result_cache.set(cache_key, result, delta)
+        return computed
+
+    def _refresh_stale(self, texts, cache_keys):
+        """Recompute stale verdicts in the background while callers are served the cached ones"""
+        metrics.inc("cache_stale_served", len(texts))
+        texts_by_key = {
+            key: text for text, key in zip(texts, cache_keys)
+            if key not in self.inflight.calls and key not in self.refreshing
+        }
+        if not texts_by_key:
+            return
+        keys = list(texts_by_key)
+        self.refreshing.update(keys)
+        metrics.inc("cache_background_refresh", len(keys))
+        if len(keys) == 1:
+            refresh = self.inflight.do(keys[0], partial(self._check_and_cache, texts_by_key[keys[0]], keys[0]))
+        else:
+            refresh = self.inflight.do_many(
+                keys, lambda new_keys: self._check_batch_and_cache([texts_by_key[key] for key in new_keys], new_keys)
+            )
+        task = asyncio.create_task(refresh)
+        self.refresh_tasks.add(task)
+        task.add_done_callback(partial(self._refresh_done, keys))
+
+    def _refresh_done(self, cache_keys, task):
+        self.refresh_tasks.discard(task)
+        self.refreshing.difference_update(cache_keys)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Background cache refresh failed: {str(task.exception())}")
+
+    async def full_check_async(self, text):
+        """Same as full_check, but rule stages run in the rule pool and the embedding comes from the encode batcher"""
+        ruleset = self.ruleset
+        stages = (await self._pool_rule_stages(evaluate_rule_stages, [text], ruleset))[0]
+        if stages['needs_semantic']:
+            try:
+                text_emb = feature_cache.get_embedding(stages['text_lower'])
+                if text_emb is None:
+                    text_emb = await encode_batcher.encode(stages['text_lower'])
+                    feature_cache.put_embedding(stages['text_lower'], text_emb)
+                stages['violations'] = ruleset._semantic_stage(text_emb)
+            except Exception as e:
+                logger.warning(f"Semantic matching error: {str(e)}")
+        return ruleset._build_result(stages)
+
+    async def _pool_rule_stages(self, fn, texts, ruleset):
+        """Run fn(texts) in the rule pool.
+
+        Thread workers are handed the caller's ruleset snapshot, so a reload
+        mid-request cannot mix rules. Forked workers read their own copy of the
+        global and only see the feature cache as it was when they were forked,
+        and are re-forked on every reload, so for process pools the token
+        features are looked up before and stored after, in the parent.
+        """
+        if rule_evaluator.kind != "process":
+            return await rule_evaluator.run(fn, texts, None, None, ruleset)
+        tier = ruleset.nlp_plan['tier']
+        if tier == 'none':
+            return await rule_evaluator.run(fn, texts)
+        texts_lower = [text.lower() for text in texts]
+        tokenized = [feature_cache.get_tokens(text_lower, tier) for text_lower in texts_lower]
+        stages = await rule_evaluator.run(fn, texts, tokenized, tier)
+        for text_lower, cached, text_stages in zip(texts_lower, tokenized, stages):
+            if cached is None:
+                feature_cache.put_tokens(text_lower, tier, text_stages['tokenized'])
+        return stages
+
+# Initialize embedding store and rule manager
+embedding_store = (
+    EmbeddingStore(EMBEDDING_STORE_DIR, MODEL_NAME, EMBEDDING_VERSION)
+    if EMBEDDING_STORE_DIR else None
+)
 rule_manager = RuleManager()
+encode_batcher = EncodeBatcher(ENCODE_MAX_WAIT_MS, ENCODE_MAX_BATCH)
+redis_pipeliner = RedisPipeliner(redis_client, REDIS_PIPELINE_MAX)
+result_cache = ResultCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL, CACHE_EXPIRY, CACHE_SOFT_TTL,
+                           VerdictCodec(CACHE_COMPRESS_MIN_BYTES))
+rule_evaluator = RuleEvaluator(RULE_EXECUTOR, RULE_WORKERS, RULE_MAX_PENDING)
+
+
+# Rule pool entry points; module level so process workers can unpickle them
+def _usable_tokens(ruleset, texts, tokenized, tier):
+    # Features computed under another NLP tier (a reload raced the request) are recomputed
+    if tokenized is None or tier != ruleset.nlp_plan['tier']:
+        return [None] * len(texts)
+    return tokenized
+
+
+# Thread pools pass the caller's snapshot; forked workers fall back to their copy of the global
+def evaluate_rule_stages(texts, tokenized=None, tier=None, ruleset=None):
+    if ruleset is None:
+        ruleset = rule_manager.ruleset
+    return [
+        ruleset._rule_stages(text, text_tokens)
+        for text, text_tokens in zip(texts, _usable_tokens(ruleset, texts, tokenized, tier))
+    ]
+
+
+def evaluate_rule_stages_batch(texts, tokenized=None, tier=None, ruleset=None):
+    if ruleset is None:
+        ruleset = rule_manager.ruleset
+    return ruleset.rule_stages_batch(texts, _usable_tokens(ruleset, texts, tokenized, tier))
+
 
 # Dependency to ensure rules are loaded
 def get_rule_manager():
@@ -534,10 +3158,26 @@ async def check_input(
                 request_id=request_id
             )
             
+        # Optionally start the classifier now, so clean text pays max(rules, classifier)
+        classifier_task = (
+            asyncio.create_task(check_llm_guardrails(request.text)) if SPECULATIVE_CLASSIFIER else None
+        )
+        
         # Check rule violations first
-        cached_result = rule_manager.check_with_cache(request.text)
+        try:
+            cached_result = await rule_manager.check_with_cache(request.text)
+        except BaseException:
+            cancel_speculative(classifier_task)
+            raise
+        # Rules whose patterns ran out of time budget on this text
+        rule_flags = (
+            {"pattern_timeout": cached_result["pattern_timeout"]} if "pattern_timeout" in cached_result else {}
+        )
         
         if cached_result["violations"]:
+            # The rules decided; the classifier verdict is not needed
+            cancel_speculative(classifier_task)
+            
             # Get rule details for response
             rule_ids = set(v["rule_id"] for v in cached_result["violations"])
             rule_details = {}
@@ -562,13 +3202,18 @@ async def check_input(
                 message="Content policy violation detected",
                 request_id=request_id,
                 metadata={
-                    "processing_time_ms": int((time.time() - start_time) * 1000)
+                    "processing_time_ms": int((time.time() - start_time) * 1000),
+                    **rule_flags
                 }
             )
 
         # If no rule violations, check with toxic classifier
         try:
-            llm_result = await check_llm_guardrails(request.text)
+            if classifier_task is not None:
+                metrics.inc("classifier_speculative_used")
+                llm_result = await classifier_task
+            else:
+                llm_result = await check_llm_guardrails(request.text)
             
             if "error" in llm_result:
                 logger.warning(f"RequestID {request_id}: Classifier error: {llm_result['error']}")
@@ -612,7 +3257,8 @@ async def check_input(
                 request_id=request_id,
                 metadata={
                     "processing_time_ms": processing_time,
-                    "toxicity_scores": toxicity_levels
+                    "toxicity_scores": toxicity_levels,
+                    **rule_flags
                 }
             )
                 
@@ -629,6 +3275,9 @@ async def check_input(
                 }
             )
             
+    except RuleEvaluatorSaturated as e:
+        logger.warning(f"RequestID {request_id}: Rejected, {str(e)}")
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"RequestID {request_id}: Processing error: {str(e)}")
         return ContentCheckResponse(
@@ -638,31 +3287,111 @@ async def check_input(
             metadata={"error": str(e)}
         )
 
-async def check_llm_guardrails(text):
-    """Calls toxic classifier API with better error handling and retries"""
-    def attempt_request():
+# Shared classifier client, created at startup and closed on shutdown
+http_client = None
+
+def create_http_client():
+    """Create the pooled keep-alive client, with HTTP/2 if enabled and h2 is installed"""
+    http2 = CLASSIFIER_HTTP2
+    if http2:
         try:
-            response = requests.post(
-                TOXIC_CLASSIFIER_URL,
-                json={"text": text},
-                timeout=API_TIMEOUT
-            )
-            if response.status_code == 200:
-                return response.json()
-            logger.warning(f"Toxic classifier API error: {response.status_code}")
-            return {"error": f"API error: {response.status_code}"}
-        except requests.exceptions.Timeout:
-            return {"error": "Classifier API timeout"}
-        except Exception as e:
-            return {"error": f"Classifier error: {str(e)}"}
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("CLASSIFIER_HTTP2 is set but h2 is not installed; using HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(API_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=CLASSIFIER_MAX_CONNECTIONS,
+            max_keepalive_connections=CLASSIFIER_MAX_KEEPALIVE,
+            keepalive_expiry=CLASSIFIER_KEEPALIVE_EXPIRY
+        )
+    )
+
+def get_http_client():
+    """Return the shared client, creating it if startup has not run"""
+    global http_client
+    if http_client is None:
+        http_client = create_http_client()
+    return http_client
+
+def cancel_speculative(task):
+    """Drop a speculative classifier call whose verdict is not needed, counting it as wasted"""
+    if task is None:
+        return
+    metrics.inc("classifier_speculative_wasted")
+    if not task.done():
+        task.cancel()
+        metrics.inc("classifier_speculative_cancelled")
+
+classifier_breaker = CircuitBreaker("classifier", CLASSIFIER_BREAKER_FAILURES, CLASSIFIER_BREAKER_RESET)
+classifier_latency = LatencyTracker()
+classifier_flight = SingleFlight("classifier")
+
+async def classifier_attempt(text, timeout):
+    """One classifier request; feeds the breaker and the latency tracker"""
+    start = time.perf_counter()
+    try:
+        response = await get_http_client().post(TOXIC_CLASSIFIER_URL, json={"text": text}, timeout=timeout)
+        if response.status_code == 200:
+            result = response.json()
+            classifier_latency.observe(time.perf_counter() - start)
+            classifier_breaker.record_success()
+            return result
+        logger.warning(f"Toxic classifier API error: {response.status_code}")
+        result = {"error": f"API error: {response.status_code}"}
+    except httpx.TimeoutException:
+        result = {"error": "Classifier API timeout"}
+    except asyncio.CancelledError:
+        classifier_breaker.release_probe()
+        raise
+    except Exception as e:
+        result = {"error": f"Classifier error: {str(e)}"}
+    classifier_breaker.record_failure()
+    return result
+
+async def hedged_classifier_call(text, timeout):
+    """Send a second request if the first is slower than the hedge percentile; first success wins"""
+    hedge_delay = classifier_latency.percentile(CLASSIFIER_HEDGE_PERCENTILE) if CLASSIFIER_HEDGE else None
+    tasks = {asyncio.create_task(classifier_attempt(text, timeout))}
+    try:
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done and classifier_breaker.state == "closed":
+                metrics.inc("classifier_hedged")
+                tasks.add(asyncio.create_task(classifier_attempt(text, timeout)))
+
+        result = None
+        pending = tasks
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if "error" not in result:
+                    return result
+        return result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def check_llm_guardrails(text):
+    """Calls toxic classifier API; concurrent calls for the same text share one request"""
+    return await classifier_flight.do(text, partial(classify_text, text))
+
+async def classify_text(text):
+    """Calls toxic classifier API behind a circuit breaker, with adaptive timeouts and hedging"""
+    if not classifier_breaker.allow():
+        metrics.inc("classifier_breaker_rejected")
+        return {"error": "Classifier unavailable (circuit open)"}
     
     # First attempt
-    result = await asyncio.to_thread(attempt_request)
+    result = await hedged_classifier_call(text, classifier_latency.timeout())
     
-    # Retry once on error
-    if "error" in result:
+    # Retry once on a fast failure; a timeout has already used the whole budget
+    if "error" in result and result["error"] != "Classifier API timeout" and classifier_breaker.allow():
         logger.info("Retrying classifier request after error")
-        result = await asyncio.to_thread(attempt_request)
+        result = await hedged_classifier_call(text, classifier_latency.timeout())
     
     return result
 
@@ -679,12 +3408,15 @@ async def batch_check(
     try:
         logger.info(f"BatchID {batch_id}: Processing {len(request.items)} items")
         
+        # Rule checks for the whole batch at once; only classifier calls stay per item
+        rule_results = await rule_manager.check_batch_with_cache([item.text for item in request.items])
+        
         # Create tasks for all items
         tasks = []
         for idx, item in enumerate(request.items):
             # Generate individual request IDs
             item_id = f"{batch_id}-{idx}"
-            tasks.append(process_single(item.text, item.context, item_id, rule_manager))
+            tasks.append(process_single(item.text, item.context, item_id, rule_manager, rule_results[idx]))
         
         # Execute in parallel
         batch_results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -713,6 +3445,9 @@ async def batch_check(
             "total_items": len(request.items),
             "processing_time_ms": processing_time
         }
+    except RuleEvaluatorSaturated as e:
+        logger.warning(f"BatchID {batch_id}: Rejected, {str(e)}")
+        raise HTTPException(status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Batch processing error: {str(e)}")
         return {
@@ -722,8 +3457,9 @@ async def batch_check(
             "processing_time_ms": int((time.time() - start_time) * 1000)
         }
 
-async def process_single(text: str, context: Optional[Dict[str, Any]], request_id: str, rule_manager: RuleManager):
-    """Process a single text item with improved handling"""
+async def process_single(text: str, context: Optional[Dict[str, Any]], request_id: str, rule_manager: RuleManager,
+                         result: Optional[Dict[str, Any]] = None):
+    """Process a single text item with improved handling; result is a precomputed rule check"""
     try:
         # Check if input is empty or too short
         if not text or not text.strip():
@@ -734,7 +3470,10 @@ async def process_single(text: str, context: Optional[Dict[str, Any]], request_i
             }
             
         # Check rule violations first
-        result = rule_manager.check_with_cache(text)
+        if result is None:
+            result = await rule_manager.check_with_cache(text)
+        # Rules whose patterns ran out of time budget on this text
+        rule_flags = {"pattern_timeout": result["pattern_timeout"]} if "pattern_timeout" in result else {}
         
         if result["violations"]:
             # Get rule details for the response
@@ -754,7 +3493,8 @@ async def process_single(text: str, context: Optional[Dict[str, Any]], request_i
                 "violations": result["violations"],
                 "rule_details": rule_details,
                 "message": "Content policy violation detected",
-                "request_id": request_id
+                "request_id": request_id,
+                **({"metadata": rule_flags} if rule_flags else {})
             }
         
         # If no rule violations, check with toxic classifier
@@ -797,7 +3537,8 @@ async def process_single(text: str, context: Optional[Dict[str, Any]], request_i
                 "message": message,
                 "request_id": request_id,
                 "metadata": {
-                    "toxicity_scores": toxicity_levels
+                    "toxicity_scores": toxicity_levels,
+                    **rule_flags
                 }
             }
                 
@@ -816,6 +3557,16 @@ async def process_single(text: str, context: Optional[Dict[str, Any]], request_i
         logger.error(f"Error processing item {request_id}: {str(e)}")
         raise e  # Let the batch handler catch this
 
+@app.get("/metrics")
+async def get_metrics():
+    """In-process service metrics"""
+    return {
+        **metrics.snapshot(),
+        "token_cache": token_normalizer.stats(),
+        "feature_cache": feature_cache.stats(),
+        "result_cache": result_cache.stats()
+    }
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -825,14 +3576,19 @@ async def health_check():
             "timestamp": time.time(),
             "version": app.version,
             "rule_count": len(rule_manager.rules),
+            "ruleset_version": rule_manager.ruleset_version,
             "services": {
-                "redis": "available" if use_redis else "unavailable"
+                "redis": "available" if use_redis else "unavailable",
+                "result_cache": cache_backend.name if cache_backend is not None else "local only",
+                "semantic_index": rule_manager.ruleset.semantic_index.name,
+                "nlp_tier": rule_manager.ruleset.nlp_plan['tier'],
+                "classifier_breaker": classifier_breaker.state
             }
         }
         
         # Try to ping the classifier API
         try:
-            response = requests.get(
+            response = await get_http_client().get(
                 TOXIC_CLASSIFIER_URL.replace('/predict', '/health'),
                 timeout=1.0
             )
@@ -883,9 +3639,17 @@ async def reload_rules():
         rule_manager.load_rules(RULES_PATH, force_reload=True)
         # Clear the cache
         get_rule_descriptions.cache_clear()
+        # New cache keys take effect now; recent texts are re-checked in the background
+        rule_manager.sync_cache_version()
         return {
             "status": "success",
             "message": f"Reloaded {len(rule_manager.rules)} rules",
+            "ruleset_version": rule_manager.ruleset_version,
+            "build_time_ms": {
+                stage: int(seconds * 1000) for stage, seconds in rule_manager.ruleset.build_stats.items()
+            },
+            "unmerged_patterns": rule_manager.ruleset.pattern_matcher.unmergeable,
+            "rejected_patterns": rule_manager.ruleset.pattern_matcher.rejected,
             "timestamp": time.time()
         }
     except Exception as e:
@@ -900,9 +3664,27 @@ async def reload_rules():
 @app.on_event("startup")
 async def startup_event():
     """Initialize rules when app starts"""
+    global use_redis, cache_backend
+    if CACHE_BACKEND in ("auto", "redis"):
+        try:
+            await redis_client.ping()  # Test connection
+            logger.info("Redis connection established")
+            use_redis = True
+        except Exception as e:
+            logger.warning(f"Redis connection failed: {str(e)}")
+            use_redis = False
+    cache_backend = make_cache_backend(CACHE_BACKEND)
+    if cache_backend is not None:
+        logger.info(f"Shared result cache: {cache_backend.name}")
+    else:
+        logger.warning("No shared result cache; caching in this worker only")
+    
     try:
+        get_http_client()
         rule_manager.load_rules(RULES_PATH)
         logger.info(f"Loaded {len(rule_manager.rules)} rules on startup")
+        # Start (and for process pools, fork) the rule workers once the rules are built
+        rule_evaluator.start()
     except Exception as e:
         logger.error(f"Error loading rules on startup: {str(e)}")
 
@@ -911,9 +3693,17 @@ async def startup_event():
 async def shutdown_event():
     """Clean up resources"""
     try:
+        for task in list(rule_manager.refresh_tasks):
+            task.cancel()
+        await encode_batcher.close()
+        rule_evaluator.close()
+        if http_client is not None:
+            await http_client.aclose()
         executor.shutdown(wait=False)
-        if use_redis:
-            redis_client.close()
+        if cache_backend is not None:
+            await cache_backend.close()
+        await redis_pipeliner.close()
+        await redis_client.aclose()
         logger.info("Cleanup completed on shutdown")
     except Exception as e:
         logger.error(f"Error during shutdown: {str(e)}")
@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+
+# The reference model must be the PyTorch one, whatever the service is configured with
+os.environ["EMBEDDING_BACKEND"] = "torch"
+
+from gaurd import model as torch_model, load_embedding_model, RULES_PATH  # noqa: E402
+
+# Parity check: ONNX embedding backends against sentence-transformers on PyTorch.
+# Every rule example plus a few free-form texts is encoded by each backend and
+# compared to the torch embedding; the check fails if any cosine similarity
+# drops below the backend's bound.
+
+MIN_COSINE = {
+    "onnx": 0.999,
+    "onnx-int8": 0.98,
+}
+
+EXTRA_TEXTS = [
+    "How's the weather today?",
+    "Tell me about machine learning",
+    "What do you think about the new health care policies?",
+    "Is it good to buy Tesla stockss?",
+    "a",
+    "word " * 600,  # Longer than max_seq_length, exercises truncation
+]
+
+
+def load_texts(rules_path):
+    with open(rules_path) as f:
+        rules = json.load(f).get("rules", [])
+    return [ex for rule in rules for ex in rule.get("examples", [])] + EXTRA_TEXTS
+
+
+def timed_encode(encoder, texts, batch_size=32):
+    start = time.perf_counter()
+    embeddings = np.asarray(encoder.encode(texts, batch_size=batch_size), dtype=np.float32)
+    return embeddings, (time.perf_counter() - start) * 1000
+
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def main():
+    texts = load_texts(sys.argv[1] if len(sys.argv) > 1 else RULES_PATH)
+    print(f"Comparing {len(texts)} texts against the torch backend")
+
+    reference, torch_ms = timed_encode(torch_model, texts)
+    print(f"torch: {torch_ms:.0f}ms")
+
+    failed = False
+    for backend, bound in MIN_COSINE.items():
+        encoder = load_embedding_model(backend)
+        embeddings, backend_ms = timed_encode(encoder, texts)
+
+        # Batched and single-text encoding must agree too
+        single = np.asarray(encoder.encode(texts[0]), dtype=np.float32)
+        batch_cosine = float(cosine_rows(single[None, :], embeddings[:1])[0])
+
+        cosines = cosine_rows(reference, embeddings)
+        worst = int(np.argmin(cosines))
+        ok = cosines[worst] >= bound and batch_cosine >= bound
+        failed |= not ok
+
+        print(f"{backend}: {backend_ms:.0f}ms, min cosine {cosines[worst]:.5f} "
+              f"(bound {bound}), mean {float(np.mean(cosines)):.5f}, "
+              f"single vs batched {batch_cosine:.5f} -> {'PASSED' if ok else 'FAILED'}")
+        if not ok:
+            print(f"  worst text: {texts[worst][:60]!r}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()